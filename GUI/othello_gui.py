@@ -142,7 +142,7 @@ class OthelloGUI:
 
     def _on_board_resized(self, event: tk.Event) -> None:
         ''' Called whenever the canvas is resized '''
-        self._board.redraw_board()
+        self._board.resize_board()
 
 
 if __name__ == '__main__':
@@ -23,6 +23,10 @@ class GameBoard:
                                      width=game_width,
                                      height=game_height,
                                      background=GAME_COLOR)
+        # Persistent canvas item ids, and the board as it is currently drawn
+        self._lines = []
+        self._cells = {}
+        self._drawn = []
 
     def new_game_settings(self, game_state) -> None:
         ''' The game board's new game settings is now changed accordingly to
@@ -30,40 +34,79 @@ class GameBoard:
         self._game_state = game_state
         self._rows = self._game_state.get_rows()
         self._cols = self._game_state.get_columns()
+        self._clear_items()
 
     def redraw_board(self) -> None:
-        ''' Redraws the board '''
+        ''' Redraws the board, recolouring only the cells that changed
+            since the last redraw '''
+        if not self._cells:
+            self._create_items()
+        self._redraw_cells()
+
+    def resize_board(self) -> None:
+        ''' Moves the board's lines and cells to fit the canvas's size '''
+        if not self._cells:
+            self.redraw_board()
+            return
+        self._redraw_lines()
+        for (row, col), cell in self._cells.items():
+            self._board.coords(cell, *self._cell_coords(row, col))
+
+    def _clear_items(self) -> None:
+        ''' Deletes every canvas item of the board '''
         self._board.delete(tkinter.ALL)
+        self._lines = []
+        self._cells = {}
+        self._drawn = []
+
+    def _create_items(self) -> None:
+        ''' Creates the board's lines and one hidden oval per cell '''
+        self._clear_items()
+        self._lines = [self._board.create_line(0, 0, 0, 0) for _ in range(self._rows + self._cols - 2)]
         self._redraw_lines()
-        self._redraw_cells()
+        for row in range(self._rows):
+            for col in range(self._cols):
+                self._cells[row, col] = self._board.create_oval(*self._cell_coords(row, col),
+                                                                state=tkinter.HIDDEN)
+        self._drawn = [[othello.NONE] * self._cols for _ in range(self._rows)]
 
     def _redraw_lines(self) -> None:
-        ''' Redraws the board's lines '''
+        ''' Moves the board's lines to fit the canvas's size '''
         row_multiplier = float(self._board.winfo_height()) / self._rows
         col_multiplier = float(self._board.winfo_width()) / self._cols
+        lines = iter(self._lines)
 
-        # Draw the horizontal lines first
+        # Horizontal lines first
         for row in range(1, self._rows):
-            self._board.create_line(0, row * row_multiplier, self.get_board_width(), row * row_multiplier)
+            self._board.coords(next(lines), 0, row * row_multiplier, self.get_board_width(), row * row_multiplier)
 
-        # Draw the column lines next
+        # Column lines next
         for col in range(1, self._cols):
-            self._board.create_line(col * col_multiplier, 0, col * col_multiplier, self.get_board_height())
+            self._board.coords(next(lines), col * col_multiplier, 0, col * col_multiplier, self.get_board_height())
 
     def _redraw_cells(self) -> None:
-        ''' Redraws all the occupied cells in the board '''
+        ''' Recolours the cells whose contents differ from the last redraw '''
+        board = self._game_state.get_board()
         for row in range(self._rows):
             for col in range(self._cols):
-                if self._game_state.get_board()[row][col] != othello.NONE:
+                if board[row][col] != self._drawn[row][col]:
+                    self._drawn[row][col] = board[row][col]
                     self._draw_cell(row, col)
 
     def _draw_cell(self, row: int, col: int) -> None:
-        ''' Draws the specified cell '''
-        self._board.create_oval(col * self.get_cell_width(),
-                                row * self.get_cell_height(),
-                                (col + 1) * self.get_cell_width(),
-                                (row + 1) * self.get_cell_height(),
-                                fill=PLAYERS[self._game_state.get_board()[row][col]])
+        ''' Draws the specified cell, hiding it if the cell is empty '''
+        player = self._game_state.get_board()[row][col]
+        if player == othello.NONE:
+            self._board.itemconfigure(self._cells[row, col], state=tkinter.HIDDEN)
+        else:
+            self._board.itemconfigure(self._cells[row, col], state=tkinter.NORMAL, fill=PLAYERS[player])
+
+    def _cell_coords(self, row: int, col: int) -> tuple[float, float, float, float]:
+        ''' Returns the canvas coordinates of the specified cell '''
+        return (col * self.get_cell_width(),
+                row * self.get_cell_height(),
+                (col + 1) * self.get_cell_width(),
+                (row + 1) * self.get_cell_height())
 
     def update_game_state(self, game_state: othello.OthelloGame) -> None:
         ''' Updates our current _game_state to the specified one in the argument '''
@@ -1,3 +1,5 @@
+import functools
+import random
 import sys
 
 import numpy as np
@@ -5,6 +7,55 @@ from colorama import init, Fore, Back, Style
 
 init(autoreset=True)
 
+# XORed into a position hash when white is to move, so search players can tell
+# the same discs with different sides to move apart
+ZOBRIST_TURN = random.Random(0).getrandbits(63)
+
+
+@functools.lru_cache(maxsize=None)
+def zobrist_keys(board_size):
+    """
+    Returns the Zobrist keys for a board size as {tile: [key per square]},
+    plus a list under key 0 holding black ^ white for every square, which is
+    what flipping a disc XORs into the hash. The keys are seeded so hashes are
+    stable between runs and processes.
+    """
+    rng = random.Random(board_size)
+    keys = {tile: [rng.getrandbits(63) for _ in range(board_size * board_size)] for tile in (1, -1)}
+    keys[0] = [black ^ white for black, white in zip(keys[1], keys[-1])]
+    return keys
+
+
+def encode_state(board_state, me, out=None):
+    """
+    Encodes one board as a network input column: me's discs become 1s, the
+    other player's -1s and empty squares 0s.
+    @param board_state
+        size x size array of Board.BLACK / Board.WHITE / 0
+    @param int me
+        the player the board is encoded for
+    @param out
+        optional preallocated (size * size, 1) array to write into
+    """
+    return np.multiply(board_state.reshape((-1, 1)), me, out=out)
+
+
+def encode_states(board_states, tiles, out=None):
+    """
+    Batch version of encode_state.
+    @param board_states
+        (N, size, size) array of boards
+    @param tiles
+        (N,) players to encode each board for
+    @param out
+        optional preallocated (N, size * size) array to write into
+    @return
+        (N, size * size) matrix, one encoded board per row
+    """
+    board_states = np.asarray(board_states)
+    n_boards = len(board_states)
+    return np.multiply(board_states.reshape((n_boards, -1)), np.reshape(tiles, (n_boards, 1)), out=out)
+
 
 class Board:
     BLACK = 1
@@ -17,6 +68,31 @@ class Board:
 
         self.remaining_squares = board_size * board_size - 4
         self.score = {Board.BLACK: 2, Board.WHITE: 2}
+        # (tile, row, col, flipped squares, number flipped, remaining_squares,
+        # hash) for every move played, newest last
+        self.undo_stack = []
+
+        # Zobrist hash of the discs, kept up to date by push/pop
+        self.zobrist = zobrist_keys(board_size)
+        self.hash = self.compute_hash()
+
+    def copy(self):
+        """
+        Returns a new board with the same position and an empty undo stack.
+        """
+        board = Board(self.board_size)
+        board.board = self.board.copy()
+        board.remaining_squares = self.remaining_squares
+        board.score = dict(self.score)
+        board.hash = self.hash
+        return board
+
+    def get_bits(self, tile):
+        """
+        Returns (own, opponent) bitboards of the position for tile, bit
+        row * 8 + col set for every disc. 8x8 boards only.
+        """
+        return state_bits(self.get_state(), tile)
 
     def init_state(self):
         self.board[3][3] = Board.BLACK
@@ -30,6 +106,23 @@ class Board:
     def get_state(self):
         return self.board
 
+    def compute_hash(self):
+        """
+        Returns the Zobrist hash of the discs computed from scratch.
+        """
+        state = self.get_state()
+        h = 0
+        for index, tile in enumerate(state.flat):
+            if tile:
+                h ^= self.zobrist[tile][index]
+        return h
+
+    def get_hash(self, tile):
+        """
+        Returns the hash of the position with tile to move.
+        """
+        return self.hash ^ ZOBRIST_TURN if tile == Board.WHITE else self.hash
+
     def is_on_board(self, x, y):
         """
         Returns True if the coordinates are located on the board.
@@ -50,27 +143,54 @@ class Board:
             true if valid
             false if invalid move - doesn't update board
         """
+        return self.push(tile, row, col)
+
+    def push(self, tile, row, col):
+        """
+        Plays tile on (row, col) and records what changed on the undo stack so
+        that pop() can take the move back without copying the board.
+        @return bool
+            true if valid
+            false if invalid move - doesn't update board
+        """
         result = self.is_valid_move(tile, row, col)
-        if result:
-            # Flip the disks
-            self.board[row][col] = tile
-            for row in result:
-                self.board[row[0]][row[1]] = tile
+        if not result:
+            return False
 
-            # Update the players' scores
-            self.score[tile] += len(result) + 1
+        self.undo_stack.append((tile, row, col, result, len(result), self.remaining_squares, self.hash))
 
-            # The gross expression is a mapping for -1 -> 1 and 1 -> -1
-            # Rescales the range to [0,1] then mod 2 then rescale back to [-1,1]
-            self.score[(((tile + 1) // 2 + 1) % 2) * 2 - 1] -= len(result)
+        # Flip the disks
+        self.board[row][col] = tile
+        self.hash ^= self.zobrist[tile][row * self.board_size + col]
+        flip_keys = self.zobrist[0]
+        for square in result:
+            self.board[square[0]][square[1]] = tile
+            self.hash ^= flip_keys[square[0] * self.board_size + square[1]]
 
-            # Number of open squares decreases by 1
-            self.remaining_squares -= 1
+        # Update the players' scores
+        n_flipped = len(result)
+        self.score[tile] += n_flipped + 1
+        self.score[-tile] -= n_flipped
 
-            return True
+        # Number of open squares decreases by 1
+        self.remaining_squares -= 1
 
-        else:
-            return False
+        return True
+
+    def pop(self):
+        """
+        Takes back the last move made with push() / update_board().
+        Raises IndexError if there is nothing to undo.
+        """
+        tile, row, col, flipped, n_flipped, remaining_squares, self.hash = self.undo_stack.pop()
+
+        self.board[row][col] = 0
+        for square in flipped:
+            self.board[square[0]][square[1]] = -tile
+
+        self.score[tile] -= n_flipped + 1
+        self.score[-tile] += n_flipped
+        self.remaining_squares = remaining_squares
 
     def is_valid_move(self, tile, xstart, ystart):
         """
@@ -127,6 +247,16 @@ class Board:
         # If no tiles were flipped, this is not a valid move.
         return tiles_to_flip
 
+    def legal_moves(self, tile):
+        """
+        @param int tile
+            self.BLACK or self.WHITE
+        Returns the list of (row, col) squares tile can play on, in row-major
+        order. An empty list means the player has to pass.
+        """
+        return [(row, col) for row in range(self.board_size) for col in range(self.board_size)
+                if self.board[row][col] == 0 and self.is_valid_move(tile, row, col)]
+
     def print_board(self):
         """
         Print board to terminal
@@ -148,3 +278,255 @@ class Board:
         for i in range(self.board_size):
             print("\t" + Back.BLACK + Fore.WHITE + f"{i + 1:<2}{get_row(self.board[i]):<2}")
             sys.stdout.write(Style.RESET_ALL)
+
+
+# Bitboard layout: bit (row * 8 + col) is set when that square is occupied,
+# which matches the action index used by the players (pos[0] * 8 + pos[1]).
+FULL_MASK = (1 << 64) - 1
+NOT_A_FILE = 0xfefefefefefefefe  # every square except column 0
+NOT_H_FILE = 0x7f7f7f7f7f7f7f7f  # every square except column 7
+
+# (shift, mask) pairs for the same eight directions Board.is_valid_move walks.
+# Positive shifts move towards higher rows/cols, the mask drops the squares that
+# wrapped around to the other side of the board.
+SHIFTS = (
+    (1, NOT_A_FILE),  # (0, 1)
+    (9, NOT_A_FILE),  # (1, 1)
+    (8, FULL_MASK),  # (1, 0)
+    (7, NOT_H_FILE),  # (1, -1)
+    (-1, NOT_H_FILE),  # (0, -1)
+    (-9, NOT_H_FILE),  # (-1, -1)
+    (-8, FULL_MASK),  # (-1, 0)
+    (-7, NOT_A_FILE),  # (-1, 1)
+)
+
+
+def state_bits(board_state, tile):
+    """
+    Returns (own, opponent) bitboards of an 8x8 state array for tile.
+    """
+    state = np.asarray(board_state).reshape(-1)
+    own = sum(1 << int(i) for i in np.flatnonzero(state == tile))
+    opp = sum(1 << int(i) for i in np.flatnonzero(state == -tile))
+    return own, opp
+
+
+def bit_indices(bits):
+    """
+    Returns the indices of all set bits, lowest first.
+    """
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+
+def bits_to_squares(bits):
+    """
+    Returns the [row, col] squares of all set bits, lowest index first.
+    """
+    return [[index >> 3, index & 7] for index in bit_indices(bits)]
+
+
+def bits_to_array(bits):
+    """
+    Returns a (64,) uint8 array with a 1 for every set bit.
+    """
+    return np.unpackbits(np.frombuffer(bits.to_bytes(8, "little"), np.uint8), bitorder="little")
+
+
+class BitBoard(Board):
+    """
+    8x8 board stored as two 64-bit ints, one per colour.
+
+    Keeps the Board API (update_board / is_valid_move / get_score / get_state)
+    so it can be dropped in wherever a Board is used, but generates and flips
+    moves with shift-and-mask operations instead of walking the array.
+    """
+
+    def __init__(self, board_size=8):
+        if board_size != 8:
+            raise ValueError("BitBoard only supports 8x8 boards")
+        self.board_size = board_size
+        self.bits = {Board.BLACK: 0, Board.WHITE: 0}
+        self._state = None
+        self.init_state()
+
+        self.remaining_squares = board_size * board_size - 4
+        self.score = {Board.BLACK: 2, Board.WHITE: 2}
+        # (tile, move bit, flipped bits, number flipped, remaining_squares, hash)
+        self.undo_stack = []
+
+        self.zobrist = zobrist_keys(board_size)
+        self.hash = self.compute_hash()
+
+    @classmethod
+    def from_bits(cls, black, white):
+        """
+        Returns a board holding the position given by the two bitboards.
+        """
+        board = cls()
+        board.bits = {Board.BLACK: black, Board.WHITE: white}
+        board._state = None
+        board.score = {Board.BLACK: black.bit_count(), Board.WHITE: white.bit_count()}
+        board.remaining_squares = 64 - (black | white).bit_count()
+        board.hash = board.compute_hash()
+        return board
+
+    def init_state(self):
+        self.bits[Board.BLACK] = (1 << (3 * 8 + 3)) | (1 << (4 * 8 + 4))
+        self.bits[Board.WHITE] = (1 << (4 * 8 + 3)) | (1 << (3 * 8 + 4))
+        self._state = None
+
+    @property
+    def board(self):
+        return self.get_state()
+
+    def get_state(self):
+        """
+        Returns the position as a board_size x board_size int array.
+        The array is rebuilt lazily after a move and shared until the next one.
+        """
+        if self._state is None:
+            state = bits_to_array(self.bits[Board.BLACK]).astype(int)
+            state -= bits_to_array(self.bits[Board.WHITE])
+            self._state = state.reshape((self.board_size, self.board_size))
+        return self._state
+
+    def push(self, tile, row, col):
+        """
+        Same contract as Board.push. The undo record stores the move and the
+        flipped discs as bitmasks.
+        """
+        if not self.is_on_board(row, col):
+            return False
+        move = 1 << int(row * 8 + col)
+        flips = self.get_flips(tile, move)
+        if not flips:
+            return False
+
+        n_flipped = flips.bit_count()
+        self.undo_stack.append((tile, move, flips, n_flipped, self.remaining_squares, self.hash))
+
+        self.bits[tile] |= flips | move
+        self.bits[-tile] &= ~flips
+        self._state = None
+
+        self.hash ^= self.zobrist[tile][row * 8 + col]
+        flip_keys = self.zobrist[0]
+        for index in bit_indices(flips):
+            self.hash ^= flip_keys[index]
+
+        self.score[tile] += n_flipped + 1
+        self.score[-tile] -= n_flipped
+        self.remaining_squares -= 1
+
+        return True
+
+    def pop(self):
+        """
+        Same contract as Board.pop.
+        """
+        tile, move, flips, n_flipped, remaining_squares, self.hash = self.undo_stack.pop()
+
+        self.bits[tile] &= ~(flips | move)
+        self.bits[-tile] |= flips
+        self._state = None
+
+        self.score[tile] -= n_flipped + 1
+        self.score[-tile] += n_flipped
+        self.remaining_squares = remaining_squares
+
+    def is_valid_move(self, tile, xstart, ystart):
+        """
+        Same contract as Board.is_valid_move: False for an occupied or
+        off-board square, otherwise the list of squares that would be flipped.
+        """
+        if not self.is_on_board(xstart, ystart):
+            return False
+        move = 1 << int(xstart * 8 + ystart)
+        if (self.bits[Board.BLACK] | self.bits[Board.WHITE]) & move:
+            return False
+        return bits_to_squares(self.get_flips(tile, move))
+
+    def legal_moves(self, tile):
+        """
+        Same contract as Board.legal_moves, computed for all squares at once.
+        """
+        return [(index >> 3, index & 7) for index in bit_indices(self.get_moves(tile))]
+
+    def copy(self):
+        return BitBoard.from_bits(self.bits[Board.BLACK], self.bits[Board.WHITE])
+
+    def get_bits(self, tile):
+        return self.bits[tile], self.bits[-tile]
+
+    def get_moves(self, tile):
+        """
+        Returns the bitmask of every square tile can legally play on.
+        """
+        return get_move_bits(self.bits[tile], self.bits[-tile])
+
+    def get_flips(self, tile, move):
+        """
+        Returns the bitmask of discs flipped by placing tile on the single-bit
+        square move, or 0 if the move is illegal.
+        """
+        own = self.bits[tile]
+        opp = self.bits[-tile]
+        if (own | opp) & move:
+            return 0
+        return get_flip_bits(own, opp, move)
+
+
+def get_move_bits(own, opp):
+    """
+    Returns the bitmask of every square the owner of the discs own can
+    legally play on against opp.
+    """
+    empty = ~(own | opp) & FULL_MASK
+
+    moves = 0
+    for shift, mask in SHIFTS:
+        # Grow runs of opponent discs away from our own discs; a run that
+        # ends next to an empty square makes that square a legal move.
+        # Six steps cover the longest possible run on an 8x8 board.
+        if shift > 0:
+            x = (own << shift) & mask & opp
+            for _ in range(5):
+                x |= (x << shift) & mask & opp
+            moves |= (x << shift) & mask & empty
+        else:
+            x = (own >> -shift) & mask & opp
+            for _ in range(5):
+                x |= (x >> -shift) & mask & opp
+            moves |= (x >> -shift) & mask & empty
+    return moves
+
+
+def get_flip_bits(own, opp, move):
+    """
+    Returns the bitmask of opp discs flipped when the owner of own plays on
+    the empty single-bit square move, 0 if the move is illegal.
+    """
+    flips = 0
+    for shift, mask in SHIFTS:
+        line = 0
+        x = ((move << shift) if shift > 0 else (move >> -shift)) & mask
+        while x & opp:
+            line |= x
+            x = ((x << shift) if shift > 0 else (x >> -shift)) & mask
+        if x & own:
+            flips |= line
+    return flips
+
+
+def create_board(board_size=8):
+    """
+    Returns the fastest board backend that supports board_size.
+    """
+    if board_size == 8:
+        return BitBoard(board_size)
+    return Board(board_size)
@@ -0,0 +1,32 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from src.nn import NN
+
+
+def convert(src, dst=None, dtype=np.float64):
+    """
+    Converts a legacy pickled .weights file into the binary weights format
+    and returns the path it was written to (src with an .nnw suffix by default).
+    """
+    dst = dst or Path(src).with_suffix(".nnw")
+    net = NN([], 0)
+    net.load_pickle(src)
+    net.save(dst, dtype)
+    return dst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickled .weights files to the binary .nnw format")
+    parser.add_argument('files', nargs='+', help="Pickled weights files to convert")
+    parser.add_argument('--float32', action='store_true', default=False, help="Store the weights as float32")
+
+    args = parser.parse_args()
+    for src in args.files:
+        print("Saved:", convert(src, dtype=np.float32 if args.float32 else np.float64))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import time
+
+from src.board import FULL_MASK, Board, bit_indices, get_flip_bits, get_move_bits
+
+# The four 4x4 quadrants of the board. An odd number of empty squares in a
+# quadrant means whoever plays there may also get the last move in it.
+QUADRANTS = (0x0f0f0f0f, 0xf0f0f0f0, 0x0f0f0f0f << 32, 0xf0f0f0f0 << 32)
+# Above this many empty squares moves are ordered fastest-first (fewest
+# replies for the opponent); below it computing the replies costs more than
+# it saves and parity alone orders the moves
+FASTEST_FIRST_EMPTIES = 6
+# The clock is only read every this many nodes
+TIME_CHECK_NODES = 1024
+
+
+class _Timeout(Exception):
+    pass
+
+
+class EndgameSolver:
+    """
+    Exact negamax alpha-beta solver for positions with at most max_empties
+    empty squares on an 8x8 board. Values are final disc differences from
+    the side to move's point of view. Moves are ordered fastest-first,
+    then by quadrant parity. After each solve, nodes and elapsed describe
+    the search so max_empties can be tuned to the per-move budget.
+    """
+
+    def __init__(self, max_empties=10, time_limit=None):
+        self.max_empties = max_empties
+        self.time_limit = time_limit
+        self.nodes = 0
+        self.elapsed = 0.0
+        self._deadline = None
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def can_solve(self, board: Board):
+        return board.board_size == 8 and board.remaining_squares <= self.max_empties
+
+    def solve(self, board: Board, tile, time_limit=None):
+        """
+        Returns (disc difference, best move) for tile to move on board, the
+        move being (row, col) or None if tile has to pass, or None if the
+        time limit ran out first. time_limit replaces the solver's own for
+        this solve.
+        """
+        own, opp = board.get_bits(tile)
+        if time_limit is None:
+            time_limit = self.time_limit
+
+        self.nodes = 0
+        start = time.perf_counter()
+        self._deadline = start + time_limit if time_limit is not None else None
+        try:
+            value, move = self.solve_root(own, opp)
+        except _Timeout:
+            return None
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+        return value, move if move is None else (move >> 3, move & 7)
+
+    def solve_root(self, own, opp):
+        moves = get_move_bits(own, opp)
+        if not moves:
+            return self.negamax(own, opp, -64, 64, False), None
+
+        alpha = -65
+        best_move = None
+        for move, flips, replies in self.order_moves(own, opp, moves):
+            value = -self.negamax(opp ^ flips, own | flips | move, -64, -alpha, False, replies)
+            if value > alpha:
+                alpha, best_move = value, move
+        return alpha, best_move.bit_length() - 1
+
+    def order_moves(self, own, opp, moves):
+        """
+        Returns [(move bit, flipped bits, opponent's replies)] for every move
+        in moves, best candidates first. The replies bitmask is None when it
+        was not needed for the ordering.
+        """
+        empty = ~(own | opp) & FULL_MASK
+        odd = 0
+        for quadrant in QUADRANTS:
+            if (empty & quadrant).bit_count() & 1:
+                odd |= quadrant
+
+        fastest_first = empty.bit_count() > FASTEST_FIRST_EMPTIES
+        ordered = []
+        for index in bit_indices(moves):
+            move = 1 << index
+            flips = get_flip_bits(own, opp, move)
+            replies = get_move_bits(opp ^ flips, own | flips | move) if fastest_first else None
+            ordered.append((move, flips, replies))
+
+        if fastest_first:
+            ordered.sort(key=lambda m: (m[2].bit_count(), not m[0] & odd))
+        else:
+            ordered.sort(key=lambda m: not m[0] & odd)
+        return ordered
+
+    def negamax(self, own, opp, alpha, beta, passed, moves=None):
+        """
+        moves may pass in own's legal moves when the caller already knows
+        them.
+        """
+        self.nodes += 1
+        if self._deadline and not self.nodes % TIME_CHECK_NODES and time.perf_counter() > self._deadline:
+            raise _Timeout()
+
+        if moves is None:
+            moves = get_move_bits(own, opp)
+        if not moves:
+            # Both players are out of moves: the game is over
+            if passed:
+                return own.bit_count() - opp.bit_count()
+            return -self.negamax(opp, own, -beta, -alpha, True)
+
+        best_value = -65
+        for move, flips, replies in self.order_moves(own, opp, moves):
+            value = -self.negamax(opp ^ flips, own | flips | move, -beta, -alpha, False, replies)
+            if value > best_value:
+                best_value = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        return best_value
+
+
+def main():
+    from src.precision_check import make_corpus
+
+    parser = argparse.ArgumentParser(description="Time the endgame solver on positions from random games")
+    parser.add_argument('-e', '--empties', type=int, nargs='+', default=[6, 8, 10, 12],
+                        help="Numbers of empty squares to solve positions with")
+    parser.add_argument('-n', '--n_positions', type=int, default=5, help="Positions per number of empty squares")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random games")
+
+    args = parser.parse_args()
+    input_states, _ = make_corpus(20000, args.seed)
+    # The corpus is encoded for the side to move, so 1 is always to move
+    empties = (input_states == 0).sum(axis=1)
+    solver = EndgameSolver(max_empties=64)
+    for n_empty in args.empties:
+        positions = input_states[empties == n_empty][:args.n_positions]
+        nodes = elapsed = 0
+        for state in positions:
+            board = Board()
+            board.board = state.reshape((8, 8))
+            solver.solve(board, 1)
+            nodes += solver.nodes
+            elapsed += solver.elapsed
+        n = max(len(positions), 1)
+        print(f"{n_empty:>2} empties: {elapsed / n * 1000:8.1f} ms/solve  {nodes / n:10.0f} nodes/solve  "
+              f"{nodes / elapsed if elapsed else 0:8.0f} nodes/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import sys
+from collections import OrderedDict
+
+
+class EvalCache:
+    """
+    Bounded LRU cache of NN.get_output results keyed by Board.get_hash(tile),
+    which covers both the discs and the side to move. The whole cache is
+    dropped as soon as the net's weights_version changes, so it never serves
+    outputs of old weights.
+    """
+
+    def __init__(self, net, max_entries=10000):
+        self.net = net
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.weights_version = net.weights_version
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the cache: the cached outputs plus the
+        dict's own table and keys.
+        """
+        values = sum(out.nbytes for out in self.entries.values())
+        return values + sys.getsizeof(self.entries) + len(self.entries) * sys.getsizeof(1 << 62)
+
+    def clear(self):
+        self.entries.clear()
+        self.weights_version = self.net.weights_version
+
+    def get_output(self, key, input_vector):
+        """
+        Returns the net's output for input_vector, the encoded position with
+        hash key. The returned array is shared with the cache and must not be
+        modified.
+        """
+        if self.weights_version != self.net.weights_version:
+            self.invalidations += 1
+            self.clear()
+
+        out = self.entries.get(key)
+        if out is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return out
+
+        self.misses += 1
+        out = self.net.get_output(input_vector)
+        self.entries[key] = out
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return out
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
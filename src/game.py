@@ -1,8 +1,10 @@
+import functools
 from dataclasses import dataclass
 
 from colorama import Back, Fore
 
 from src import board
+from src.game_log import PASS, GameRecord
 from src.players import PlayerModel
 
 
@@ -15,62 +17,139 @@ class Player:
 
 
 class Game:
-    def __init__(self, player_1, log_history_1, player_2, log_history_2, board_size=8):
-        self.board = board.Board(board_size=board_size)
+    def __init__(self, player_1, log_history_1, player_2, log_history_2, board_size=8, game_log=None, seed=0):
+        self.board = board.create_board(board_size=board_size)
         self.players = [
             Player(name="Player 1", model=player_1, id=-1, log_history=log_history_1),
             Player(name="Player 2", model=player_2, id=1, log_history=log_history_2)
         ]
+        # Every finished game is appended to game_log (a GameLogWriter) if set
+        if game_log is not None and game_log.board_size != board_size:
+            raise ValueError(f"{game_log.filename} holds games of a different board size")
+        self.game_log = game_log
+        self.seed = seed
+        # row * board_size + col of every ply so far, PASS for passes. Only
+        # recorded for the game log.
+        self.moves = bytearray() if game_log is not None else None
 
     def clear_board(self):
-        self.board = board.Board(self.board.board_size)
+        self.board = board.create_board(self.board.board_size)
+        if self.moves is not None:
+            self.moves = bytearray()
+
+    def place(self, tile, row, col):
+        """
+        Plays tile on (row, col) and records the move if it was valid and
+        there is a game log.
+        """
+        if not self.board.update_board(tile, row, col):
+            return False
+        if self.moves is not None:
+            self.moves.append(row * self.board.board_size + col)
+        return True
+
+    def get_record(self):
+        score = self.get_score()
+        return GameRecord(
+            players=tuple(type(player.model).__name__ for player in self.players),
+            seed=self.seed,
+            scores=tuple(score[player.id] for player in self.players),
+            moves=bytes(self.moves)
+        )
 
     def get_score(self):
         return self.board.score
 
-    def run(self, show_board=False):
-        if show_board:
-            print("\t" + Back.WHITE + Fore.BLACK + f"{'Game Start':^18}")
-            print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 1: ' + str(self.get_score()[self.players[0].id]):<18}")
-            print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 2: ' + str(self.get_score()[self.players[1].id]):<18}")
-            self.board.print_board()
-
+    def turns(self):
+        """
+        Returns [(player, place function)], one place function per player
+        for the whole game. Moves are only recorded when there is a game log.
+        """
+        if self.moves is None:
+            return [(player, functools.partial(self.board.update_board, player.id)) for player in self.players]
+        return [(player, functools.partial(self.place, player.id)) for player in self.players]
+
+    def passed(self):
+        if self.moves is not None:
+            self.moves.append(PASS)
+
+    def plies(self):
+        """
+        Plays the game to the end, yielding (move number, player number)
+        right before every ply. A game ends after two passes in a row, when
+        the board is full or when a player has no discs left.
+        """
+        board = self.board
+        turns = self.turns()
         move_number = 1
         n_passed = 0
-        # Run until both players have passed
-        while n_passed < 2:
-            if show_board:
+        while True:
+            for i, (player, place) in enumerate(turns, start=1):
+                yield move_number, i
+                # Player ids [-1, 1] are used to indicate which player is making the move
+                if player.model.play(place, board, board.get_state(), player.id, log_history=player.log_history):
+                    n_passed = 0
+                    if board.remaining_squares == 0 or not board.score[-player.id]:
+                        return
+                else:
+                    self.passed()
+                    n_passed += 1
+                    if n_passed == 2:
+                        return
+            move_number += 1
+
+    def run_headless(self):
+        """
+        Plays the game without any output, the path used by tests and
+        training, and returns the final score. Same rules as plies, without
+        the per-ply hooks.
+        """
+        board = self.board
+        turns = self.turns()
+        n_passed = 0
+        while True:
+            for player, place in turns:
+                if player.model.play(place, board, board.get_state(), player.id, log_history=player.log_history):
+                    n_passed = 0
+                    if board.remaining_squares == 0 or not board.score[-player.id]:
+                        return self.get_score()
+                else:
+                    self.passed()
+                    n_passed += 1
+                    if n_passed == 2:
+                        return self.get_score()
+
+    def run_console(self):
+        """
+        Plays the game printing the board after every ply.
+        """
+        print("\t" + Back.WHITE + Fore.BLACK + f"{'Game Start':^18}")
+        print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 1: ' + str(self.get_score()[self.players[0].id]):<18}")
+        print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 2: ' + str(self.get_score()[self.players[1].id]):<18}")
+        self.board.print_board()
+
+        for move_number, i in self.plies():
+            if move_number > 1 or i > 1:
+                self.board.print_board()
+            if i == 1:
                 print("\n\t" + Back.WHITE + Fore.BLACK + f"{'Move ' + str(move_number):^18}")
                 print(
                     "\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 1: ' + str(self.get_score()[self.players[0].id]):<18}")
                 print("\t" + Back.CYAN + Fore.BLACK + f"{'Player 2: ' + str(self.get_score()[self.players[1].id]):<18}")
+            print("\t" + Back.YELLOW + (Fore.RED if i == 1 else Fore.BLUE) + f"{str(i) + ' player`s turn':<18}")
+        self.board.print_board()
 
-            n_passed = 0
-
-            for i, player in enumerate(self.players, start=1):
-                if show_board:
-                    print("\t" + Back.YELLOW + (
-                        Fore.RED if i == 1 else Fore.BLUE) + f"{str(i) + ' player`s turn':<18}") if show_board else None
-                # Pass the player a function it can use to make a move
-                # Player ids [-1, 1] are used to indicate which player is making the move
-                did_move = player.model.play(
-                    lambda r, c: self.board.update_board(player.id, r, c), self.board,
-                    self.board.get_state(), player.id, log_history=player.log_history
-                )
-
-                if show_board:
-                    self.board.print_board()
-
-                if not did_move:
-                    n_passed += 1
-                if not all(self.board.get_score().values()):
-                    break
+    def run(self, show_board=False):
+        if show_board:
+            self.run_console()
+        else:
+            self.run_headless()
 
-            move_number += 1
-            if not all(self.board.get_score().values()):
-                break
+        if self.game_log is not None:
+            self.game_log.write(self.get_record())
 
-        player1_score, player2_score = list(map(str, self.get_score().values()))
+        score = self.get_score()
+        player1_score, player2_score = score[self.players[0].id], score[self.players[1].id]
         if player1_score > player2_score:
             winner = 'Player 1'
         elif player1_score < player2_score:
@@ -81,7 +160,7 @@ class Game:
         if show_board:
             print("\n\n\t" + Back.WHITE + Fore.BLACK + f"{'Game Over':^18}")
             print("\t" + Back.YELLOW + Fore.BLACK + f"{'Winner: ' + winner:<18}")
-            print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 1: ' + player1_score:<18}")
-            print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 2: ' + player2_score:<18}")
+            print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 1: ' + str(player1_score):<18}")
+            print("\t" + Back.MAGENTA + Fore.BLACK + f"{'Player 2: ' + str(player2_score):<18}")
 
         return winner
@@ -0,0 +1,144 @@
+import argparse
+import os
+import struct
+from dataclasses import dataclass
+
+from src.board import create_board
+
+# File layout: FILE_HEADER once, then for every game GAME_HEADER, the two
+# player names in UTF-8 and one byte per ply (row * board_size + col, or
+# PASS). Records are appended whole, so several processes can share a log.
+GAME_LOG_MAGIC = b"OTGL"
+GAME_LOG_VERSION = 1
+# magic, version, board size
+FILE_HEADER = struct.Struct("<4sHB")
+# number of plies, seed, player 1 score, player 2 score, name lengths
+GAME_HEADER = struct.Struct("<HIBBBB")
+PASS = 0xFF
+
+
+def check_board_size(board_size):
+    """
+    Raises a ValueError if the squares of a board_size board do not fit in
+    the byte values below PASS.
+    """
+    if board_size ** 2 > PASS:
+        raise ValueError(f"Game logs store moves in one byte, {board_size}x{board_size} boards are not supported")
+
+
+@dataclass
+class GameRecord:
+    players: tuple
+    seed: int
+    scores: tuple
+    # One byte per ply, player 1 first, passes included
+    moves: bytes
+
+    def to_bytes(self):
+        names = [name.encode()[:255] for name in self.players]
+        return (GAME_HEADER.pack(len(self.moves), self.seed % 2 ** 32, *self.scores, *map(len, names))
+                + b"".join(names) + bytes(self.moves))
+
+    def replay(self, board_size=8):
+        """
+        Yields (board, tile, move) before every ply of the game, move being
+        (row, col) or None for a pass. The same board object is played on
+        after each yield.
+        """
+        check_board_size(board_size)
+        board = create_board(board_size)
+        # Player 1 has id -1 and moves first, as in Game
+        tile = -1
+        for move in self.moves:
+            if move == PASS:
+                yield board, tile, None
+            else:
+                row, col = divmod(move, board_size)
+                yield board, tile, (row, col)
+                board.update_board(tile, row, col)
+            tile = -tile
+
+
+class GameLogWriter:
+    """
+    Appends GameRecords to a binary game log, creating the file and its
+    header if needed. Each record goes to disk with a single unbuffered
+    write on an O_APPEND descriptor, so worker processes can log to the
+    same file.
+    """
+
+    def __init__(self, filename, board_size=8):
+        check_board_size(board_size)
+        self.filename = filename
+        self.board_size = board_size
+        self.fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size == 0:
+            os.write(self.fd, FILE_HEADER.pack(GAME_LOG_MAGIC, GAME_LOG_VERSION, board_size))
+        elif read_header(filename) != board_size:
+            os.close(self.fd)
+            raise ValueError(f"{filename} holds games of a different board size")
+
+    def write(self, record):
+        os.write(self.fd, record.to_bytes())
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(filename):
+    """
+    Returns the board size of a game log.
+    """
+    with open(filename, "rb") as f:
+        magic, version, board_size = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != GAME_LOG_MAGIC:
+        raise ValueError(f"{filename} is not a game log")
+    if version != GAME_LOG_VERSION:
+        raise ValueError(f"{filename} has unsupported game log version {version}")
+    return board_size
+
+
+def read_games(filename):
+    """
+    Lazily yields every GameRecord of a game log, reading one game at a time.
+    """
+    read_header(filename)
+    with open(filename, "rb", buffering=1 << 20) as f:
+        f.seek(FILE_HEADER.size)
+        while header := f.read(GAME_HEADER.size):
+            if len(header) < GAME_HEADER.size:
+                raise ValueError(f"{filename} ends with a truncated game")
+            n_moves, seed, score_1, score_2, name_1, name_2 = GAME_HEADER.unpack(header)
+            names = f.read(name_1 + name_2)
+            moves = f.read(n_moves)
+            if len(moves) < n_moves:
+                raise ValueError(f"{filename} ends with a truncated game")
+            yield GameRecord((names[:name_1].decode(), names[name_1:].decode()), seed, (score_1, score_2), moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise binary game logs")
+    parser.add_argument('files', nargs='+', help="Game logs to read")
+
+    args = parser.parse_args()
+    for filename in args.files:
+        n_games = n_plies = wins = losses = 0
+        for record in read_games(filename):
+            n_games += 1
+            n_plies += len(record.moves)
+            wins += record.scores[0] > record.scores[1]
+            losses += record.scores[0] < record.scores[1]
+        print(f"{filename}: {n_games} games, {n_plies} plies, "
+              f"player 1 won {wins}, lost {losses}, drew {n_games - wins - losses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import queue
+import threading
 import time
 import tkinter as tk
 from tkinter import messagebox
@@ -6,6 +8,8 @@ import itertools
 import random
 
 from src import nn
+from src.board import encode_state, state_bits
+from src.opening_book import OpeningBook
 
 
 # Constants
@@ -15,6 +19,59 @@ EMPTY = 0
 BLACK = 1
 WHITE = 2
 DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+# How often the Tk loop checks for the AI's reply, once per frame at 60 fps
+POLL_MS = 16
+
+
+def is_valid_move(board, row, col, color):
+    if board[row][col] != EMPTY:
+        return False
+    for direction in DIRECTIONS:
+        if check_direction(board, row, col, direction, color):
+            return True
+    return False
+
+
+def check_direction(board, row, col, direction, color):
+    x, y = direction
+    r = row + x
+    c = col + y
+    if r < 0 or r >= BOARD_SIZE or c < 0 or c >= BOARD_SIZE or board[r][c] == EMPTY or board[r][c] == color:
+        return False
+    while board[r][c] != color:
+        r += x
+        c += y
+        if r < 0 or r >= BOARD_SIZE or c < 0 or c >= BOARD_SIZE or board[r][c] == EMPTY:
+            return False
+    return True
+
+
+def flip_tiles(board, row, col, direction, color):
+    x, y = direction
+    r = row + x
+    c = col + y
+    while board[r][c] != color:
+        board[r][c] = color
+        r += x
+        c += y
+
+
+def place(board, row, col, color):
+    """
+    Plays color at (row, col) on board if the move is legal and returns
+    whether it was.
+    """
+    if not is_valid_move(board, row, col, color):
+        return False
+    board[row][col] = color
+    for direction in DIRECTIONS:
+        if check_direction(board, row, col, direction, color):
+            flip_tiles(board, row, col, direction, color)
+    return True
+
+
+def board_key(board):
+    return tuple(map(tuple, board))
 
 
 class RLPlayer:
@@ -25,15 +82,26 @@ class RLPlayer:
         self.discount_factor = discount_factor
         self.play_history = []
         self.wins = 0
+        self.input_buffer = np.empty((board_size ** 2, 1), int)
+        # OpeningBook consulted before the net
+        self.opening_book = None
 
     def play(self, place_func, board, board_state, me, log_history=True):
-        input_state = np.apply_along_axis(
-            lambda x: int((x == me and 1) or (x != 0 and -1)), 1, board_state.reshape((BOARD_SIZE ** 2, 1))).reshape(
-            (BOARD_SIZE ** 2, 1))
+        # This board marks white with 2, so map it onto the 1 / -1 tiles the
+        # encoder expects first
+        signed_state = (board_state == BLACK).astype(int) - (board_state == WHITE)
+        input_state = encode_state(signed_state, 1 if me == BLACK else -1, out=self.input_buffer)
         made_move = False
         pos = None
 
-        if np.random.random() < self.epsilon:
+        if self.opening_book is not None:
+            # The AI places white discs
+            move = self.opening_book.lookup_bits(*state_bits(signed_state, -1))
+            if move is not None:
+                pos = move // BOARD_SIZE, move % BOARD_SIZE
+                made_move = place_func(*pos, WHITE)
+
+        if not made_move and np.random.random() < self.epsilon:
             positions = list(itertools.product(range(8), repeat=2))
             random.shuffle(positions)
             while not made_move and positions:
@@ -43,10 +111,11 @@ class RLPlayer:
             if not made_move and not positions:
                 return False
 
-        else:
+        elif not made_move:
             out = self.policy_net.get_output(input_state)
             positions = [(v, i) for i, v in enumerate(out)]
-            positions.sort(key=lambda x: x[0], reverse=True)
+            # Ascending, so pop() tries the move the network desires most first
+            positions.sort(key=lambda x: x[0])
 
             while not made_move and positions:
                 scalar_play_point = positions.pop()[1]
@@ -84,7 +153,8 @@ class RLPlayer:
 
 
 class OthelloGame:
-    def __init__(self, nn_weights="./models/21140501-1-1-8-best-linear-0.03.weights"):
+    def __init__(self, nn_weights="./models/21140501-1-1-8-best-linear-0.03.nnw", precision="float64",
+                 opening_book=None):
         self.board = [[EMPTY] * BOARD_SIZE for _ in range(BOARD_SIZE)]
         self.board[3][3] = WHITE
         self.board[3][4] = BLACK
@@ -95,62 +165,56 @@ class OthelloGame:
         self.root.title("Othello")
         self.canvas = tk.Canvas(self.root, width=CELL_SIZE * BOARD_SIZE, height=CELL_SIZE * BOARD_SIZE, bg="green")
         self.canvas.pack()
+        # (row, col) -> disc oval item, and the board as currently drawn
+        self.discs = {}
+        self.drawn = [[EMPTY] * BOARD_SIZE for _ in range(BOARD_SIZE)]
 
         self.rl_player = RLPlayer()
         self.rl_player.policy_net.load(nn_weights)
+        self.rl_player.policy_net.set_precision(precision)
+        if opening_book:
+            self.rl_player.opening_book = OpeningBook.load(opening_book)
+
+        # The AI computes and ponders in a worker thread. Only that thread
+        # touches rl_player and ponder_cache, which maps positions after a
+        # human move to the AI's reply; only the Tk thread touches the board
+        # and the canvas.
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.ponder_cache = {}
+        self.thinking = False
+        threading.Thread(target=self.think, daemon=True).start()
 
     def draw_board(self):
-        self.canvas.delete("all")
+        """
+        Creates the canvas items on the first call, afterwards only
+        recolours the discs of cells that changed since the last draw.
+        """
+        if not self.discs:
+            for row in range(BOARD_SIZE):
+                for col in range(BOARD_SIZE):
+                    x1 = col * CELL_SIZE
+                    y1 = row * CELL_SIZE
+                    x2 = x1 + CELL_SIZE
+                    y2 = y1 + CELL_SIZE
+                    self.canvas.create_rectangle(x1, y1, x2, y2, fill="green", outline="black")
+                    self.discs[row, col] = self.canvas.create_oval(x1, y1, x2, y2, state="hidden")
+
         for row in range(BOARD_SIZE):
             for col in range(BOARD_SIZE):
-                x1 = col * CELL_SIZE
-                y1 = row * CELL_SIZE
-                x2 = x1 + CELL_SIZE
-                y2 = y1 + CELL_SIZE
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill="green", outline="black")
-                if self.board[row][col] == BLACK:
-                    self.canvas.create_oval(x1, y1, x2, y2, fill="black")
-                elif self.board[row][col] == WHITE:
-                    self.canvas.create_oval(x1, y1, x2, y2, fill="white")
-
-    def is_valid_move(self, row, col, color):
-        if self.board[row][col] != EMPTY:
-            return False
-        for direction in DIRECTIONS:
-            if self.check_direction(row, col, direction, color):
-                return True
-        return False
-
-    def check_direction(self, row, col, direction, color):
-        x, y = direction
-        r = row + x
-        c = col + y
-        if r < 0 or r >= BOARD_SIZE or c < 0 or c >= BOARD_SIZE or self.board[r][c] == EMPTY or self.board[r][
-            c] == color:
-            return False
-        while self.board[r][c] != color:
-            r += x
-            c += y
-            if r < 0 or r >= BOARD_SIZE or c < 0 or c >= BOARD_SIZE or self.board[r][c] == EMPTY:
-                return False
-        return True
-
-    def flip_tiles(self, row, col, direction, color):
-        x, y = direction
-        r = row + x
-        c = col + y
-        while self.board[r][c] != color:
-            self.board[r][c] = color
-            r += x
-            c += y
+                color = self.board[row][col]
+                if self.drawn[row][col] == color:
+                    continue
+                self.drawn[row][col] = color
+                if color == EMPTY:
+                    self.canvas.itemconfigure(self.discs[row, col], state="hidden")
+                else:
+                    self.canvas.itemconfigure(self.discs[row, col], state="normal",
+                                              fill="black" if color == BLACK else "white")
 
     def make_move(self, row, col, color):
-        if not self.is_valid_move(row, col, color):
+        if not place(self.board, row, col, color):
             return False
-        self.board[row][col] = color
-        for direction in DIRECTIONS:
-            if self.check_direction(row, col, direction, color):
-                self.flip_tiles(row, col, direction, color)
         self.draw_board()
         return True
 
@@ -164,14 +228,74 @@ class OthelloGame:
         white_count = sum(row.count(WHITE) for row in self.board)
         return black_count, white_count
 
+    def ai_reply(self, board):
+        """
+        Returns the AI's move (row, col) on board, or None if it has to
+        pass. Plays on a copy, so it is safe to call off the Tk thread.
+        """
+        scratch = [row[:] for row in board]
+        placed = []
+
+        def place_func(row, col, color):
+            if place(scratch, row, col, color):
+                placed.append((row, col))
+                return True
+            return False
+
+        self.rl_player.play(place_func, scratch, np.array(board), BLACK, log_history=False)
+        return placed[0] if placed else None
+
+    def think(self):
+        """
+        Worker thread loop. A ("move", board) job answers with the AI's reply
+        on results, taken from the ponder cache when the human played a
+        reply that was pondered. A ("ponder", board) job fills the cache with
+        the AI's reply to every legal human move, stopping early as soon as
+        the next job arrives.
+        """
+        while True:
+            kind, board = self.jobs.get()
+            key = board_key(board)
+            if kind == "move":
+                reply = self.ponder_cache[key] if key in self.ponder_cache else self.ai_reply(board)
+                self.ponder_cache.clear()
+                self.results.put(reply)
+                continue
+
+            for row, col in itertools.product(range(BOARD_SIZE), repeat=2):
+                if not self.jobs.empty():
+                    break
+                child = [r[:] for r in board]
+                if place(child, row, col, BLACK):
+                    self.ponder_cache[board_key(child)] = self.ai_reply(child)
+
     def ai_move(self):
-        if self.rl_player.play(self.make_move, self.board, np.array(self.board), BLACK):
+        """
+        Hands the current position to the worker thread, poll_ai applies its
+        reply.
+        """
+        self.thinking = True
+        self.jobs.put(("move", [row[:] for row in self.board]))
+
+    def poll_ai(self):
+        try:
+            reply = self.results.get_nowait()
+        except queue.Empty:
+            reply = False
+        if reply is not False:
+            self.thinking = False
+            if reply is not None:
+                self.make_move(*reply, WHITE)
             if self.is_game_over():
                 self.end_game()
-            return True
-        return False
+                return
+            # Think about the human's replies while they think about theirs
+            self.jobs.put(("ponder", [row[:] for row in self.board]))
+        self.root.after(POLL_MS, self.poll_ai)
 
     def handle_click(self, event):
+        if self.thinking:
+            return
         col = event.x // CELL_SIZE
         row = event.y // CELL_SIZE
         if self.make_move(row, col, BLACK):
@@ -195,6 +319,8 @@ class OthelloGame:
     def start(self):
         self.draw_board()
         self.canvas.bind("<Button-1>", self.handle_click)
+        self.jobs.put(("ponder", [row[:] for row in self.board]))
+        self.root.after(POLL_MS, self.poll_ai)
         self.root.mainloop()
 
 
@@ -1,14 +1,14 @@
 import argparse
-import collections
+import multiprocessing
 import os
 import sys
 from pathlib import Path
 
-from tqdm import tqdm
-
 from src.game import Game
+from src.opening_book import OpeningBook
 from src.gui_tkinter import OthelloGame
-from src.players import HumanPlayer, RLPlayer
+from src.players import AlphaBetaPlayer, HumanPlayer, MCTSPlayer, RLPlayer, RootParallelSearch
+from src.tournament import run_tournament
 from src.training.train import main as train
 
 
@@ -18,9 +18,9 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-g', '--gui', action='store_true', default=False, help="Run GUI version of game")
     parser.add_argument('-b', '--hideboard', action='store_true', default=False, help="Hide board during gameplay, using for testing models where AI is playing against AI")
-    parser.add_argument('-p1', '--player1', choices=["ai", "human"], type=str, default="human",
+    parser.add_argument('-p1', '--player1', choices=["ai", "search", "mcts", "human"], type=str, default="human",
                         help="Type of Player 1")
-    parser.add_argument('-p2', '--player2', choices=["ai", "human"], type=str, default="ai",
+    parser.add_argument('-p2', '--player2', choices=["ai", "search", "mcts", "human"], type=str, default="ai",
                         help="Type of Player 2")
     parser.add_argument('-w1', '--weights1', type=str, help="Path to weights file for player 1")
     parser.add_argument('-w2', '--weights2', type=str, help="Path to weights file for player 2")
@@ -29,10 +29,40 @@ def main():
     parser.add_argument('-d', '--difficulty', choices=["easy", "medium", "hard"], type=str, default="medium",
                         help="Difficulty of AI. Sets weights to both players.")
 
+    # int8 is left out: its forward pass is slower than float32 and loses moves
+    parser.add_argument('--precision', choices=("float64", "float32"), type=str, default="float64",
+                        help="Precision of the AI's network at play time")
+    parser.add_argument('-t', '--think_time', type=float, default=1.0,
+                        help="Seconds a search player may think per move, also the endgame solver's limit for ai players")
+
+    parser.add_argument('--threads', type=int, default=1,
+                        help="Worker processes a search or mcts player splits each move's search over")
+    parser.add_argument('--simulations', type=int, default=400,
+                        help="Simulations per move of an mcts player, which also stops at the think time")
+    parser.add_argument('-e', '--endgame_empties', type=int,
+                        help="Solve positions with at most this many empty squares exactly (0 disables, "
+                             "default off for ai, 10 for search and 6 for mcts players)")
+
+    parser.add_argument('--book', type=str, help="Opening book for ai and search players, e.g. models/opening.book")
+
     parser.add_argument('-n', '--n_epochs', type=int, default=20, help="Number of epochs to train model")
     parser.add_argument('-s', '--match_size', type=int, default=20, help="Number of games to play per epoch")
     parser.add_argument('-f', '--discount_factor', type=float, default=0.97, help="Discount factor for RL")
     parser.add_argument('-l', '--net_lr', type=float, default=0.03, help="Learning rate for neural network")
+    parser.add_argument('-bs', '--batch_size', type=int, default=32, help="Mini-batch size for training updates")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="Number of processes playing self-play or test games")
+    parser.add_argument('-v', '--vectorized', action='store_true', default=False,
+                        help="Play each worker's self-play games in lockstep with batched moves")
+    parser.add_argument('-a', '--augment', action='store_true', default=False,
+                        help="Train on all 8 board symmetries of every transition")
+    parser.add_argument('-r', '--replay', type=int, default=0,
+                        help="Capacity in transitions of a replay buffer to sample training batches from")
+    parser.add_argument('--prioritised', action='store_true', default=False,
+                        help="Sample the replay buffer in proportion to each transition's TD error")
+    parser.add_argument('--game_log', type=str,
+                        help="Append every self-play or test game to this binary game log")
+    parser.add_argument('--seed', type=int, default=0, help="Base random seed for test games")
 
     args = parser.parse_args()
     p1 = args.player1
@@ -47,9 +77,9 @@ def main():
     n_epochs = args.n_epochs
 
     difficulty = {
-        "easy": os.path.join(app_dir, "models", "easy.weights"),
-        "medium": os.path.join(app_dir, "models", "medium.weights"),
-        "hard": os.path.join(app_dir, "models", "hard.weights")
+        "easy": os.path.join(app_dir, "models", "easy.nnw"),
+        "medium": os.path.join(app_dir, "models", "medium.nnw"),
+        "hard": os.path.join(app_dir, "models", "hard.nnw")
     }
     w1 = difficulty.get(w1, w1)
     w2 = difficulty.get(w2, w2)
@@ -57,50 +87,76 @@ def main():
     if args.difficulty:
         w1 = w2 = difficulty[args.difficulty]
 
+    # Keyword arguments shared by the ai and search players
+    options = {} if args.endgame_empties is None else {"endgame_empties": args.endgame_empties}
+
+    book_path = args.book
+    options["opening_book"] = OpeningBook.load(book_path) if book_path else None
+
     if p1 == "human":
         player_1 = HumanPlayer()
+    elif p1 == "search":
+        player_1 = AlphaBetaPlayer(time_limit=args.think_time, precision=args.precision, n_workers=args.threads,
+                                   **options)
+        player_1.policy_net.load(w1)
+    elif p1 == "mcts":
+        player_1 = MCTSPlayer(args.simulations, time_limit=args.think_time, precision=args.precision,
+                              n_workers=args.threads, **options)
+        player_1.policy_net.load(w1)
     else:
-        player_1 = RLPlayer()
+        player_1 = RLPlayer(precision=args.precision, endgame_time=args.think_time, **options)
         player_1.policy_net.load(w1)
 
     if p2 == "human":
         player_2 = HumanPlayer()
+    elif p2 == "search":
+        player_2 = AlphaBetaPlayer(time_limit=args.think_time, precision=args.precision, n_workers=args.threads,
+                                   **options)
+        player_2.policy_net.load(w2)
+    elif p2 == "mcts":
+        player_2 = MCTSPlayer(args.simulations, time_limit=args.think_time, precision=args.precision,
+                              n_workers=args.threads, **options)
+        player_2.policy_net.load(w2)
     else:
-        player_2 = RLPlayer()
+        player_2 = RLPlayer(precision=args.precision, endgame_time=args.think_time, **options)
         player_2.policy_net.load(w2)
 
-    if mode == "play":
-        if args.gui:
-            if p1 != "human" and p2 != "ai":
-                raise ValueError("GUI only supports human vs AI")
+    try:
+        if mode == "play":
+            if args.gui:
+                if p1 != "human" and p2 != "ai":
+                    raise ValueError("GUI only supports human vs AI")
+                else:
+                    game = OthelloGame(nn_weights=w2, precision=args.precision, opening_book=book_path)
+                    game.start()
             else:
-                game = OthelloGame(nn_weights=w2)
-                game.start()
-        else:
-            game = Game(player_1, False, player_2, False, board_size=8)
-            game.run(show_board=True)
-
-        sys.exit(0)
-
-    if mode == "train":
-        train(n_epochs, match_size, discount_factor, net_lr)
+                game = Game(player_1, False, player_2, False, board_size=8)
+                game.run(show_board=True)
 
-        sys.exit(0)
+            sys.exit(0)
 
-    if mode == "test":
-        results = collections.defaultdict(lambda: 0)
+        if mode == "train":
+            train(n_epochs, match_size, discount_factor, net_lr, args.batch_size, args.workers, args.vectorized,
+                  args.augment, args.replay, args.prioritised, args.game_log)
 
-        game = Game(player_1, False, player_2, False, board_size=8)
-        for i in tqdm(range(n_epochs), desc=f"Testing"):
-            winner = game.run(show_board=not args.hideboard)
-            game.clear_board()
-            results[winner] += 1
+            sys.exit(0)
 
-        for player, wins in results.items():
-            print(f"{player} won {wins} times")
+        if mode == "test":
+            # Human players cannot be sent to worker processes
+            n_workers = args.workers if "human" not in (p1, p2) else 1
+            result = run_tournament(player_1, player_2, n_epochs, n_workers=n_workers, seed=args.seed,
+                                    show_board=not args.hideboard, game_log=args.game_log)
+            print(result)
+    finally:
+        # Search players keep their worker processes until closed
+        for player in (player_1, player_2):
+            if isinstance(player, RootParallelSearch):
+                player.close()
 
 
 if __name__ == '__main__':
+    # Worker processes of a frozen Windows executable start here too
+    multiprocessing.freeze_support()
     print(
         "GUI has limited functionality. Specifically, it only supports human vs AI.\n"
         "Please use the console version for full functionality: AI vs AI, AI vs Human, Human vs Human"
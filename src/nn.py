@@ -1,37 +1,193 @@
 #!/usr/bin/env python3
 
 import pickle
+import struct
+import warnings
 
 import numpy as np
 
+# Binary weights file: a fixed header (magic, format version, dtype code,
+# number of layer dims), the layer dims as uint32, zero padding up to a
+# multiple of 16 bytes, then every layer's (dims[i + 1], dims[i] + 1) matrix
+# as raw row-major data, first layer first.
+WEIGHTS_MAGIC = b"OTNN"
+WEIGHTS_VERSION = 1
+WEIGHTS_HEADER = struct.Struct("<4sHBxI")
+WEIGHTS_DTYPES = {0: np.dtype("<f8"), 1: np.dtype("<f4")}
+
+# Precisions get_output / get_output_batch can run at. Training always updates
+# the float64 layers, the other precisions are inference-only copies of them.
+PRECISIONS = ("float64", "float32", "int8")
+
 
 class NN:
     def __init__(self, layer_dims, learning_rate):
         self.learning_rate = learning_rate
         self.layer_dims = layer_dims
+        self.precision = "float64"
+        # Bumped every time the weights or the precision change, so anything
+        # derived from them (reduced-precision copies, cached outputs) knows
+        # to rebuild
+        self.weights_version = 0
+        self._inference_layers = None
+
         self.layers = []
         for i in range(len(layer_dims) - 1):
             self.layers.append(np.random.normal(0, 1, size=(layer_dims[i + 1], layer_dims[i] + 1)))
 
-    def save(self, filename):
+    @property
+    def layers(self):
+        return self._layers
+
+    @layers.setter
+    def layers(self, layers):
+        self._layers = layers
+        self.weights_changed()
+
+    def weights_changed(self):
+        """
+        Must be called after the layers are modified in place.
+        """
+        self.weights_version += 1
+        self._inference_layers = None
+
+    def set_precision(self, precision):
+        """
+        Selects the precision of the forward pass:
+            float64 - the training weights as they are
+            float32 - float32 copies of the weights
+            int8    - int8 weights with one scale per layer; they take an
+                      eighth of the memory, but NumPy has no int8 matrix
+                      product, so they are widened to float32 per call
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}")
+        self.precision = precision
+        self.weights_changed()
+
+    def get_inference_layers(self):
+        """
+        Returns the (weights, bias, scale) of every layer at the current
+        precision, rebuilt after the training weights change. weights is the
+        transposed (inputs, outputs) matrix; scale is None unless int8.
+        """
+        if self._inference_layers is None:
+            inference_layers = []
+            for layer in self.layers:
+                weights = layer[:, :-1].T
+                bias = layer[:, -1].astype(np.float32)
+                if self.precision == "int8":
+                    scale = np.float32(np.abs(weights).max() / 127 or 1)
+                    weights = np.round(weights / scale).astype(np.int8)
+                else:
+                    scale = None
+                    weights = np.ascontiguousarray(weights, np.float32)
+                inference_layers.append((weights, bias, scale))
+            self._inference_layers = inference_layers
+        return self._inference_layers
+
+    def save(self, filename, dtype=np.float64):
+        """
+        Writes the layers in the binary weights format, as float64 or float32.
+        """
+        dtype = np.dtype(dtype).newbyteorder("<")
+        dtype_code = next(code for code, d in WEIGHTS_DTYPES.items() if d == dtype)
+        header = WEIGHTS_HEADER.pack(WEIGHTS_MAGIC, WEIGHTS_VERSION, dtype_code, len(self.layer_dims))
+        header += struct.pack(f"<{len(self.layer_dims)}I", *self.layer_dims)
+        header += b"\0" * (-len(header) % 16)
+
         with open(filename, "wb") as f:
-            pickle.dump(self.layers, f)
+            f.write(header)
+            for layer in self.layers:
+                f.write(np.ascontiguousarray(layer, dtype).tobytes())
+
+    def load(self, filename, mmap=True):
+        """
+        Reads a file written by save. With mmap the layers are copy-on-write
+        views of the memory-mapped file, so nothing is read or copied until
+        it is used and training never writes back to the file. Files in the
+        legacy pickled format are still read, with a warning.
+        """
+        with open(filename, "rb") as f:
+            header = f.read(WEIGHTS_HEADER.size)
+            if len(header) < WEIGHTS_HEADER.size or header[:4] != WEIGHTS_MAGIC:
+                warnings.warn(f"{filename} holds pickled weights, which are deprecated. "
+                              f"Convert them with src/convert_weights.py", FutureWarning, stacklevel=2)
+                self.load_pickle(filename)
+                return
+            _, version, dtype_code, n_dims = WEIGHTS_HEADER.unpack(header)
+            if version != WEIGHTS_VERSION:
+                raise ValueError(f"{filename} has unsupported weights format version {version}")
+            layer_dims = list(struct.unpack(f"<{n_dims}I", f.read(4 * n_dims)))
+            offset = WEIGHTS_HEADER.size + 4 * n_dims
+            offset += -offset % 16
+
+            dtype = WEIGHTS_DTYPES[dtype_code]
+            if mmap:
+                data = np.memmap(f, dtype, mode="c", offset=offset)
+            else:
+                f.seek(offset)
+                data = np.frombuffer(f.read(), dtype).copy()
+
+        layers = []
+        start = 0
+        for n_in, n_out in zip(layer_dims, layer_dims[1:]):
+            size = n_out * (n_in + 1)
+            layers.append(data[start:start + size].reshape((n_out, n_in + 1)))
+            start += size
 
-    def load(self, filename):
+        self.layer_dims = layer_dims
+        self.layers = layers
+
+    def load_pickle(self, filename):
+        """
+        Reads the legacy pickled weights format. Unpickling can run arbitrary
+        code, so only use this on trusted files, e.g. to convert them.
+        """
         with open(filename, "rb") as f:
             self.layers = pickle.load(f)
+        self.layer_dims = [self.layers[0].shape[1] - 1] + [layer.shape[0] for layer in self.layers]
 
     def mk_vec(self, vector1D, add_bias=True):
         return np.reshape(vector1D, (len(vector1D), 1))
 
     def get_output(self, input_vector):
-        outputs = input_vector
-        for i in range(len(self.layers)):
-            outputs = activation(self.layers[i] @ np.vstack((outputs, 1)))
+        # A single (n, 1) column is a batch of one
+        return self.get_output_batch(input_vector.reshape((1, -1))).T
+
+    def get_output_batch(self, X):
+        """
+        Forward pass for many positions at once.
+        @param X
+            (N, layer_dims[0]) matrix, one input per row
+        @return
+            (N, layer_dims[-1]) matrix of outputs
+        """
+        if self.precision != "float64":
+            return self.get_output_reduced(X)
+
+        outputs = X
+        for layer in self.layers:
+            # The last column of every layer holds the bias weights, so instead
+            # of stacking a column of ones onto the input the bias is added as a
+            # broadcast row from a view of that column
+            outputs = activation(outputs @ layer[:, :-1].T + layer[:, -1])
         # outputs = softmax(self.layers[-1]@np.vstack((outputs, 1)))
 
         return outputs
 
+    def get_output_reduced(self, X):
+        """
+        get_output_batch for the float32 and int8 precisions; returns float32.
+        """
+        outputs = np.asarray(X, np.float32)
+        for weights, bias, scale in self.get_inference_layers():
+            if scale is None:
+                outputs = activation(outputs @ weights + bias)
+            else:
+                outputs = activation((outputs @ weights.astype(np.float32)) * scale + bias)
+        return outputs
+
     def back_prop(self, sample, target):
         # Propagate forwards to get the network's layers' outputs
         outputs = [sample]
@@ -74,6 +230,42 @@ class NN:
             # Because outputs[0] == input sample, layer[i] input == outputs[i]
             # This is delta_weights
             self.layers[i] += self.learning_rate * np.c_[outputs[i].T, 1] * layer_deltas[i]
+        self.weights_changed()
+
+        return outputs[-1]
+
+    def back_prop_batch(self, samples, targets):
+        """
+        Mini-batch version of back_prop: computes the gradients of all samples
+        with matrix operations and applies their average as a single update.
+        @param samples
+            (N, layer_dims[0]) matrix, one input per row
+        @param targets
+            (N, layer_dims[-1]) matrix, one target per row
+        @return
+            (N, layer_dims[-1]) outputs of the network before the update
+        """
+        n_samples = len(samples)
+
+        # Propagate forwards to get the network's layers' outputs
+        outputs = [samples]
+        for layer in self.layers:
+            outputs.append(activation(outputs[-1] @ layer[:, :-1].T + layer[:, -1]))
+
+        # Output layer is special
+        layer_deltas = [None] * len(self.layers)
+        layer_deltas[-1] = (targets - outputs[-1]) * dactivation(outputs[-1])
+
+        # Walk backwards from the second to last layer, dropping the bias
+        # column because it does not feed back into the previous layer
+        for i in range(len(layer_deltas) - 2, -1, -1):
+            layer_deltas[i] = dactivation(outputs[i + 1]) * (layer_deltas[i + 1] @ self.layers[i + 1][:, :-1])
+
+        for i in range(len(self.layers)):
+            # Average the per-sample weight and bias deltas over the batch
+            self.layers[i][:, :-1] += self.learning_rate / n_samples * (layer_deltas[i].T @ outputs[i])
+            self.layers[i][:, -1] += self.learning_rate / n_samples * layer_deltas[i].sum(axis=0)
+        self.weights_changed()
 
         return outputs[-1]
 
@@ -0,0 +1,180 @@
+import argparse
+import struct
+from collections import defaultdict
+
+import numpy as np
+
+from src import symmetry
+from src.board import FULL_MASK, BitBoard, Board, get_flip_bits
+from src.game_log import read_games
+
+# File layout: BOOK_HEADER, then n_entries sorted uint64 position keys and
+# n_entries uint8 moves, both little-endian
+BOOK_MAGIC = b"OTBK"
+BOOK_VERSION = 1
+# magic, version, number of entries
+BOOK_HEADER = struct.Struct("<4sHxxI")
+
+
+def _mix(x):
+    # splitmix64 finaliser
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & FULL_MASK
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & FULL_MASK
+    return x ^ (x >> 31)
+
+
+def position_key(own, opp):
+    """
+    64-bit key of the position with own to move.
+    """
+    return _mix(_mix(own) ^ opp)
+
+
+def canonical_key(own, opp):
+    """
+    Returns (key, k): the key of the canonical version of the position and
+    the symmetry k that produces it.
+    """
+    own, opp, k = symmetry.canonical_bits(own, opp)
+    return position_key(own, opp), k
+
+
+class OpeningBook:
+    """
+    Best moves of opening positions in two sorted arrays: canonical position
+    keys and the move (row * 8 + col) on the canonical position. One book
+    entry covers all 8 symmetric versions of a position.
+    """
+
+    def __init__(self, keys=None, moves=None):
+        self.keys = np.zeros(0, np.uint64) if keys is None else keys
+        self.moves = np.zeros(0, np.uint8) if moves is None else moves
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(self.keys)))
+            f.write(self.keys.astype("<u8").tobytes())
+            f.write(self.moves.astype(np.uint8).tobytes())
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Memory-maps a book file, so loading costs the same for any book size.
+        """
+        with open(filename, "rb") as f:
+            magic, version, n_entries = BOOK_HEADER.unpack(f.read(BOOK_HEADER.size))
+        if magic != BOOK_MAGIC:
+            raise ValueError(f"{filename} is not an opening book")
+        if version != BOOK_VERSION:
+            raise ValueError(f"{filename} has unsupported opening book version {version}")
+        if not n_entries:
+            return cls()
+        keys = np.memmap(filename, "<u8", "r", BOOK_HEADER.size, (n_entries,))
+        moves = np.memmap(filename, np.uint8, "r", BOOK_HEADER.size + 8 * n_entries, (n_entries,))
+        return cls(keys, moves)
+
+    def lookup_bits(self, own, opp):
+        """
+        Returns the book move (row * 8 + col) for own to move, or None if the
+        position is not in the book.
+        """
+        if not len(self.keys):
+            return None
+        key, k = canonical_key(own, opp)
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+        if i == len(self.keys) or int(self.keys[i]) != key:
+            return None
+
+        move = symmetry.transform_action(int(self.moves[i]), symmetry.INVERSES[k])
+        # A key collision could point at an illegal square
+        if (own | opp) & (1 << move) or not get_flip_bits(own, opp, 1 << move):
+            return None
+        return move
+
+    def lookup(self, board: Board, tile):
+        """
+        Returns the book move (row, col) for tile to move on board, or None.
+        """
+        if board.board_size != 8:
+            return None
+        move = self.lookup_bits(*board.get_bits(tile))
+        return None if move is None else (move >> 3, move & 7)
+
+
+def build_book(records, max_plies=16, min_games=3, search_player=None):
+    """
+    Builds an OpeningBook from GameRecords. Every position within the first
+    max_plies plies that was reached in at least min_games games is entered
+    with the move that scored best for the side to move, among the moves
+    played at least min_games times. With a search_player (an
+    AlphaBetaPlayer) the book move of each position is the search's choice
+    instead.
+    """
+    # canonical key -> (own, opp) of the canonical position, and
+    # canonical key -> canonical move -> [games, summed result]
+    positions = {}
+    stats = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+    for record in records:
+        # Result of the game for player 1 (tile -1) in [-1, 1]
+        result = (record.scores[0] - record.scores[1]) / max(sum(record.scores), 1)
+        for ply, (board, tile, move) in enumerate(record.replay()):
+            if ply >= max_plies:
+                break
+            if move is None:
+                continue
+            own, opp, k = symmetry.canonical_bits(*board.get_bits(tile))
+            key = position_key(own, opp)
+            positions[key] = (own, opp)
+            entry = stats[key][symmetry.transform_action(move[0] * 8 + move[1], k)]
+            entry[0] += 1
+            entry[1] += -result if tile == 1 else result
+
+    book = {}
+    for key, moves in stats.items():
+        if sum(n for n, _ in moves.values()) < min_games:
+            continue
+        if search_player is not None:
+            # The side to move plays black on the canonical position
+            board = BitBoard.from_bits(*positions[key])
+            row, col = search_player.search(board, Board.BLACK, board.legal_moves(Board.BLACK))
+            book[key] = row * 8 + col
+            continue
+
+        played = [(total / n, move) for move, (n, total) in moves.items() if n >= min_games]
+        if played:
+            book[key] = max(played)[1]
+
+    keys = np.array(sorted(book), np.uint64)
+    return OpeningBook(keys, np.array([book[int(key)] for key in keys], np.uint8))
+
+
+def main():
+    from src.players import AlphaBetaPlayer
+
+    parser = argparse.ArgumentParser(description="Build an opening book from game logs")
+    parser.add_argument('logs', nargs='+', help="Game logs to mine")
+    parser.add_argument('-o', '--output', type=str, default="models/opening.book", help="Book file to write")
+    parser.add_argument('--plies', type=int, default=16, help="Number of opening plies to enter in the book")
+    parser.add_argument('--min_games', type=int, default=3,
+                        help="Times a position and its move must have been played to be entered")
+    parser.add_argument('-w', '--weights', type=str,
+                        help="Choose book moves with an alpha-beta search using these weights")
+    parser.add_argument('-t', '--think_time', type=float, default=0.5, help="Seconds of search per book position")
+
+    args = parser.parse_args()
+    search_player = None
+    if args.weights:
+        search_player = AlphaBetaPlayer(time_limit=args.think_time, endgame_empties=0)
+        search_player.policy_net.load(args.weights)
+
+    records = (record for log in args.logs for record in read_games(log))
+    book = build_book(records, args.plies, args.min_games, search_player)
+    book.save(args.output)
+    print(f"Saved {len(book)} positions to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,14 @@
-import itertools
+import multiprocessing
 import random
+import time
 
 import numpy as np
 
 from src import nn
-from src.board import Board
+from src.board import Board, encode_state
+from src.endgame import EndgameSolver
+from src.eval_cache import EvalCache
+from src.transposition import TranspositionTable
 
 
 class PlayerModel:
@@ -13,9 +17,19 @@ class PlayerModel:
 
 
 class RLPlayer(PlayerModel):
-    def __init__(self, discount_factor=1, net_lr=0.01, q_lr=0.3, board_size=8):
+    def __init__(self, discount_factor=1, net_lr=0.01, q_lr=0.3, board_size=8, precision="float64",
+                 eval_cache_size=10000, endgame_empties=0, endgame_time=None, opening_book=None):
         # self.policy_net = nn.NN([64, 128, 128, 64, 64], net_lr)
         self.policy_net = nn.NN([board_size ** 2, board_size ** 2 * 2, board_size ** 2 * 2, board_size ** 2, board_size ** 2], net_lr)
+        # Forward pass precision, see NN.set_precision
+        self.policy_net.set_precision(precision)
+        # Net outputs of recently seen positions, 0 disables the cache
+        self.eval_cache = EvalCache(self.policy_net, eval_cache_size) if eval_cache_size else None
+        # Positions with at most endgame_empties empty squares are solved
+        # exactly instead of asking the net, 0 disables the solver
+        self.endgame = EndgameSolver(endgame_empties, endgame_time) if endgame_empties else None
+        # OpeningBook whose moves are played before the net is consulted
+        self.opening_book = opening_book
 
         # This ought to decay
         self.epsilon = 0.2
@@ -23,79 +37,651 @@ class RLPlayer(PlayerModel):
         self.discount_factor = discount_factor
         self.play_history = []
         self.wins = 0
+        # Reused for every move so encoding a position allocates nothing
+        self.input_buffer = np.empty((board_size ** 2, 1), int)
 
     def play(self, place_func, board: Board, board_state, me, log_history=True):
+        # Every square we could play on, found in a single pass over the board
+        moves = board.legal_moves(me)
+
+        # If we can make no move... pass
+        if not moves:
+            return False
+
         # Transform all of "this player's" tokens to 1s and the other player's
         # to -1s
-        input_state = np.apply_along_axis(lambda x: int((x == me and 1) or (x != 0 and -1)),
-                                          1, board_state.reshape((board.board_size ** 2, 1))).reshape(
-            (board.board_size ** 2, 1))
-        made_move = False
-        pos = None
-
-        # epsilon greedy to pick random move
-        if np.random.random() < self.epsilon:
-            positions = list(itertools.product(range(8), repeat=2))
-            random.shuffle(positions)
-            while not made_move and positions:
-                pos = positions.pop()
-                made_move = place_func(*pos)
-
-            # If we can make no move... pass
-            if not made_move and not positions:
-                return False
-
-        else:
-            out = self.policy_net.get_output(input_state)
-            # Sort the possible moves lowest to highest desire
-            positions = [(v, i) for i, v in enumerate(out)]
-            positions.sort(key=lambda x: x[0], reverse=True)
-
-            while not made_move and positions:
-                # Grab next desired move point
-                scalar_play_point = positions.pop()[1]
-                # Convert the scalar to a 2D coordinate to play on the board
-                pos = scalar_play_point // board.board_size, scalar_play_point % board.board_size
-                made_move = place_func(*pos)
-
-            # If we can make no move... pass
-            if not made_move and not positions:
-                return False
+        input_state = encode_state(board_state, me, out=self.input_buffer)
+
+        pos = self.known_move(board, me)
+        if pos is None:
+            # epsilon greedy to pick random move
+            if np.random.random() < self.epsilon:
+                pos = random.choice(moves)
+
+            else:
+                out = self.evaluate(board, me, input_state)
+                # Play the legal move the network desires most
+                pos = max(moves, key=lambda p: out[p[0] * board.board_size + p[1]])
+
+        place_func(*pos)
 
         if log_history:
             self.play_history.append((np.copy(input_state), pos[0] * 8 + pos[1]))
 
         return True
 
+    def known_move(self, board: Board, tile, time_limit=None):
+        """
+        Returns the opening book move or, near the end of the game, the
+        endgame solver's move for tile, or None if neither covers the
+        position. time_limit replaces the solver's own time limit.
+        """
+        if self.opening_book is not None:
+            pos = self.opening_book.lookup(board, tile)
+            if pos:
+                return pos
+        if self.endgame and self.endgame.can_solve(board):
+            solved = self.endgame.solve(board, tile, time_limit)
+            if solved:
+                return solved[1]
+        return None
+
+    def evaluate(self, board: Board, tile, input_state):
+        """
+        Returns the policy net's output for board with tile to move, where
+        input_state is the board encoded for tile. Goes through the eval
+        cache when there is one; the result must not be modified.
+        """
+        if self.eval_cache:
+            return self.eval_cache.get_output(board.get_hash(tile), input_state)
+        return self.policy_net.get_output(input_state)
+
+    def choose_moves(self, input_states, legal):
+        """
+        Batch version of play's move choice for games run in lockstep.
+        @param input_states
+            (N, board_size ** 2) encoded boards, one per row
+        @param legal
+            (N, board_size ** 2) bool mask of each board's legal squares
+        @return
+            (N,) chosen action indices
+        """
+        actions = np.empty(len(input_states), int)
+
+        # epsilon greedy to pick random moves: the legal square with the
+        # highest random key
+        explore = np.random.random(len(input_states)) < self.epsilon
+        if explore.any():
+            keys = np.where(legal[explore], np.random.random(legal[explore].shape), -1)
+            actions[explore] = keys.argmax(axis=1)
+
+        greedy = ~explore
+        if greedy.any():
+            out = self.policy_net.get_output_batch(input_states[greedy])
+            actions[greedy] = np.where(legal[greedy], out, -np.inf).argmax(axis=1)
+
+        return actions
+
+    def get_training_batch(self, final_score):
+        """
+        Returns the (states, targets) matrices, one row per recorded ply of
+        play_history, that update_weights trains the policy net on.
+        """
+        states = np.hstack([state for state, _ in self.play_history]).T
+        actions = np.array([action for _, action in self.play_history])
+        # Q-values of every recorded state from a single forward pass
+        qs = self.policy_net.get_output_batch(states)
+
+        targets = qs.copy()
+        plies = np.arange(len(actions) - 1)
+        # q[action] += self.q_lr * (self.discount_factor * np.max(q_) - q[action])
+        targets[plies, actions[:-1]] += self.discount_factor * qs[1:].max(axis=1)
+        # Last state-action is win/lose which should just be the final score
+        # q[action] += self.q_lr * (final_score - q[action])
+        targets[-1, actions[-1]] = final_score
+
+        return states, targets
+
+    def get_replay_targets(self, states, actions, next_states, returns, dones):
+        """
+        Same targets as get_training_batch for a mini-batch of transitions
+        sampled from a ReplayBuffer. Also returns the TD error of each
+        transition's action, for prioritised replay.
+        """
+        n_samples = len(states)
+        qs = self.policy_net.get_output_batch(np.vstack((states, next_states)))
+        qs, next_qs = qs[:n_samples], qs[n_samples:]
+
+        targets = qs.copy()
+        rows = np.arange(n_samples)
+        bootstrapped = qs[rows, actions] + self.discount_factor * next_qs.max(axis=1)
+        targets[rows, actions] = np.where(dones, returns, bootstrapped)
+
+        return targets, targets[rows, actions] - qs[rows, actions]
+
     def update_weights(self, final_score):
-        i = 0
-        state, action = self.play_history[i]
-        q = self.policy_net.get_output(state)
-        n_play_history = len(self.play_history)
-        while i < n_play_history:
-            i += 1
-
-            # Last state-action is win/lose which should just be the final score
-            if i == n_play_history:
-                # q[action] += self.q_lr * (final_score - q[action])
-                q[action] = final_score
+        """
+        Trains the policy net on the game in play_history with a single
+        mini-batch update.
+        """
+        self.policy_net.back_prop_batch(*self.get_training_batch(final_score))
+
+
+# Search player of a root-parallel worker process, set once per process
+_search_player = None
+
+
+def _init_search_worker(player):
+    global _search_player
+    _search_player = player
+
+
+def _search_worker(task):
+    return _search_player.search_task(*task)
+
 
+class RootParallelSearch:
+    """
+    Root parallelism for search players: n_workers processes each hold a
+    copy of the player (transposition table included) and search their own
+    copy of the board, and the player merges their root results. The
+    processes are started on the first parallel search and kept until
+    close().
+    """
+
+    n_workers = 1
+    _pool = None
+
+    @property
+    def parallel(self):
+        # Daemonic processes, such as tournament workers, cannot start workers
+        # of their own and search on their own
+        return self.n_workers > 1 and not multiprocessing.current_process().daemon
+
+    def map_workers(self, tasks):
+        """
+        Runs search_task(*task) for every task on the workers, one task per
+        worker, and returns the results in order.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.n_workers, initializer=_init_search_worker, initargs=(self,))
+        return self._pool.map(_search_worker, tasks, chunksize=1)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_pool", None)
+        return state
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when the per-move time budget runs out.
+    """
+    pass
+
+
+# Static square weights used to order moves inside the search tree: corners
+# first, the squares next to the corners last.
+SQUARE_WEIGHTS = np.array([
+    [100, -20, 10, 5, 5, 10, -20, 100],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [10, -2, 1, 1, 1, 1, -2, 10],
+    [5, -2, 1, 0, 0, 1, -2, 5],
+    [5, -2, 1, 0, 0, 1, -2, 5],
+    [10, -2, 1, 1, 1, 1, -2, 10],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [100, -20, 10, 5, 5, 10, -20, 100],
+]).tolist()
+
+
+def final_score(board, tile):
+    """
+    Returns the game result from tile's point of view on the same [-1, 1]
+    scale the training loop uses: (own - opponent) / discs on the board.
+    """
+    score = board.get_score()
+    return (score[tile] - score[-tile]) / (score[tile] + score[-tile])
+
+
+class AlphaBetaPlayer(RLPlayer, RootParallelSearch):
+    """
+    Negamax alpha-beta search with iterative deepening and a per-move time
+    budget. Leaves are scored with the policy net (the best Q-value among the
+    legal moves) unless a heuristic(board, tile) -> [-1, 1] is given.
+    Results are shared between iterations and moves through a transposition
+    table of tt_memory_mb megabytes (0 disables it), which also keeps the
+    leaf values, so the eval cache is off unless eval_cache_size is given.
+    With n_workers > 1 the root moves are split between that many worker
+    processes.
+    """
+
+    def __init__(self, max_depth=6, time_limit=1.0, heuristic=None, tt_memory_mb=16, discount_factor=1, net_lr=0.01,
+                 board_size=8, precision="float64", eval_cache_size=0, endgame_empties=10, opening_book=None,
+                 n_workers=1):
+        super().__init__(discount_factor, net_lr, board_size=board_size, precision=precision,
+                         eval_cache_size=eval_cache_size, endgame_empties=endgame_empties, endgame_time=time_limit,
+                         opening_book=opening_book)
+        self.epsilon = 0
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.heuristic = heuristic or self.net_value
+        self.tt = TranspositionTable(tt_memory_mb) if tt_memory_mb else None
+        self.n_workers = n_workers
+        self.nodes = 0
+        # Value and depth of the last completed iteration of the last search,
+        # and the (best move, value) of each of its completed iterations from
+        # depth 0, the net's best move and its Q-value
+        self.best_value = 0.0
+        self.depth = 0
+        self.iterations = []
+        self._deadline = None
+
+    def play(self, place_func, board: Board, board_state, me, log_history=True):
+        moves = board.legal_moves(me)
+
+        # If we can make no move... pass
+        if not moves:
+            return False
+
+        # The opening book, endgame solver and search share one time budget
+        start = time.perf_counter()
+        pos = self.known_move(board, me, self.time_limit)
+        if pos is None:
+            time_limit = self.time_limit - (time.perf_counter() - start)
+            if self.parallel:
+                pos = self.search_parallel(board, me, moves, time_limit)
             else:
-                state_, action_ = self.play_history[i]
-                q_ = self.policy_net.get_output(state_)
-                # q[action] += self.q_lr * (self.discount_factor * np.max(q_) - q[action])
-                q[action] += self.discount_factor * np.max(q_)
+                pos = self.search(board, me, moves, time_limit)
+        place_func(*pos)
+
+        if log_history:
+            self.play_history.append((encode_state(board_state, me), pos[0] * 8 + pos[1]))
+
+        return True
+
+    def search_parallel(self, board: Board, tile, moves, time_limit=None):
+        """
+        Deals the root moves, in policy net order, round-robin to the workers;
+        each one searches its share for the whole time budget. Values are
+        only compared at the deepest depth every worker completed, down to
+        depth 0, the net's own scores. Returns the best move.
+        """
+        out = self.evaluate(board, tile, encode_state(board.get_state(), tile, out=self.input_buffer))
+        moves = sorted(moves, key=lambda p: out[p[0] * board.board_size + p[1]], reverse=True)
+        tasks = [(board.copy(), tile, moves[i::self.n_workers], time_limit)
+                 for i in range(min(self.n_workers, len(moves)))]
+
+        results = self.map_workers(tasks)
+        self.nodes = sum(nodes for _, nodes in results)
+        # Ties go to the earlier worker, whose moves the net prefers
+        self.depth = min(len(iterations) for iterations, _ in results) - 1
+        best_move, self.best_value = max((iterations[self.depth] for iterations, _ in results),
+                                         key=lambda iteration: iteration[1])
+        return best_move
+
+    def search_task(self, board: Board, tile, moves, time_limit):
+        self.search(board, tile, moves, time_limit)
+        return self.iterations, self.nodes
 
-            self.policy_net.back_prop(state, self.policy_net.mk_vec(q))
+    def search(self, board: Board, tile, moves, time_limit=None):
+        """
+        Iteratively deepens until max_depth or the time budget (time_limit,
+        or the player's own if None) is reached and returns the best move of
+        the last completed iteration. The board is searched in place with
+        push/pop and is left unchanged.
+        """
+        self.nodes = 0
+        self._deadline = time.perf_counter() + (self.time_limit if time_limit is None else time_limit)
+        if self.tt:
+            self.tt.new_search()
+
+        # Root moves are ordered by the policy net once, then the best move of
+        # each completed iteration is tried first in the next one
+        out = self.evaluate(board, tile, encode_state(board.get_state(), tile, out=self.input_buffer))
+        moves = sorted(moves, key=lambda p: out[p[0] * board.board_size + p[1]], reverse=True)
+        best_move = moves[0]
+        self.best_value, self.depth = float(out[best_move[0] * board.board_size + best_move[1], 0]), 0
+        self.iterations = [(best_move, self.best_value)]
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best_move, self.best_value = self.search_root(board, tile, moves, depth)
+            except SearchTimeout:
+                break
+            self.depth = depth
+            self.iterations.append((best_move, self.best_value))
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+        return best_move
+
+    def search_root(self, board: Board, tile, moves, depth):
+        alpha, beta = -np.inf, np.inf
+        best_move = moves[0]
+        for move in moves:
+            board.push(tile, *move)
+            try:
+                value = -self.negamax(board, -tile, depth - 1, -beta, -alpha, False)
+            finally:
+                board.pop()
+            if value > alpha:
+                alpha, best_move = value, move
+        return best_move, alpha
+
+    def negamax(self, board: Board, tile, depth, alpha, beta, passed):
+        self.nodes += 1
+        if time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        moves = board.legal_moves(tile)
+        if not moves:
+            # Both players are out of moves: the game is over
+            if passed:
+                return final_score(board, tile)
+            return -self.negamax(board, -tile, depth, -beta, -alpha, True)
+
+        key = board.get_hash(tile)
+        tt_move = -1
+        entry = self.tt.probe(key) if self.tt else None
+        if entry:
+            tt_depth, bound, tt_move, value = entry
+            if tt_depth >= depth and (bound == TranspositionTable.EXACT
+                                      or bound == TranspositionTable.LOWER and value >= beta
+                                      or bound == TranspositionTable.UPPER and value <= alpha):
+                return value
+
+        if depth <= 0:
+            value = self.heuristic(board, tile)
+            if self.tt:
+                self.tt.store(key, 0, TranspositionTable.EXACT, -1, value)
+            return value
+
+        # The best move found for this position before goes first, then the
+        # rest by square weight
+        size = board.board_size
+        moves.sort(key=lambda p: SQUARE_WEIGHTS[p[0]][p[1]] if p[0] * size + p[1] != tt_move else np.inf,
+                   reverse=True)
+
+        alpha_orig = alpha
+        best_value, best_move = -np.inf, moves[0]
+        for move in moves:
+            board.push(tile, *move)
+            try:
+                value = -self.negamax(board, -tile, depth - 1, -beta, -alpha, False)
+            finally:
+                board.pop()
+            if value > best_value:
+                best_value, best_move = value, move
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+
+        if self.tt:
+            if best_value <= alpha_orig:
+                bound = TranspositionTable.UPPER
+            elif best_value >= beta:
+                bound = TranspositionTable.LOWER
+            else:
+                bound = TranspositionTable.EXACT
+            self.tt.store(key, depth, bound, best_move[0] * size + best_move[1], best_value)
+        return best_value
+
+    def net_value(self, board: Board, tile):
+        """
+        Value of the position for tile: the highest Q-value the policy net
+        gives to any of tile's legal moves.
+        """
+        out = self.evaluate(board, tile, encode_state(board.get_state(), tile, out=self.input_buffer))
+        return max(out[row * board.board_size + col, 0] for row, col in board.legal_moves(tile))
+
+
+class MCTSPlayer(RLPlayer, RootParallelSearch):
+    """
+    Monte Carlo tree search with PUCT selection. The policy net outputs
+    action values, so expanding a node gives both the priors of its children
+    (a softmax of the Q-values of the legal moves) and the value of each
+    child from the mover's point of view, which is what a new leaf backs up
+    and what unvisited children are selected by. Finished games back up
+    their result as -1, 0 or 1. Up to batch_size leaves are collected per
+    net call, with a virtual loss on the paths already taken so the
+    selections spread out. Every move searches until n_simulations leaves
+    were expanded or time_limit seconds passed, whichever comes first.
+
+    The tree lives in preallocated arrays of max_nodes entries; the children
+    of a node are stored next to each other, so a node only keeps the index
+    of its first child. Positions are not stored but replayed on the board
+    with push/pop. Once the arrays are full, leaves are still evaluated but
+    no longer expanded.
+
+    With n_workers > 1 every worker process grows its own tree, with
+    Dirichlet noise mixed into its root priors so the trees differ, and
+    the root visit counts are summed.
+    """
+
+    # Move code of a pass in the tree
+    PASS = -1
+
+    def __init__(self, n_simulations=400, time_limit=None, c_puct=1.0, batch_size=8, virtual_loss=1.0,
+                 prior_temperature=0.5, max_nodes=100000, discount_factor=1, net_lr=0.01, board_size=8,
+                 precision="float64", endgame_empties=6, opening_book=None, n_workers=1, root_noise=0.25):
+        super().__init__(discount_factor, net_lr, board_size=board_size, precision=precision, eval_cache_size=0,
+                         endgame_empties=endgame_empties, endgame_time=time_limit, opening_book=opening_book)
+        self.epsilon = 0
+        self.n_simulations = n_simulations
+        self.time_limit = time_limit
+        self.c_puct = c_puct
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.prior_temperature = prior_temperature
+        self.n_workers = n_workers
+        # Weight of the Dirichlet noise in the root priors of worker searches
+        self.root_noise = root_noise
+        self._noise = 0.0
+
+        self.max_nodes = max_nodes
+        self.visits = np.zeros(max_nodes, np.float32)
+        # Summed values from the point of view of the player who made the
+        # move leading to the node
+        self.value_sum = np.zeros(max_nodes, np.float32)
+        self.prior = np.zeros(max_nodes, np.float32)
+        # The net's Q-value of the move leading to the node
+        self.q = np.zeros(max_nodes, np.float32)
+        self.move = np.zeros(max_nodes, np.int16)
+        self.first_child = np.full(max_nodes, -1, np.int32)
+        self.n_children = np.zeros(max_nodes, np.int16)
+        self.n_nodes = 0
+
+        self.simulations = 0
+        self.elapsed = 0.0
+
+    def play(self, place_func, board: Board, board_state, me, log_history=True):
+        moves = board.legal_moves(me)
+
+        # If we can make no move... pass
+        if not moves:
+            return False
+
+        # The opening book, endgame solver and search share one time budget
+        start = time.perf_counter()
+        pos = self.known_move(board, me, self.time_limit)
+        if pos is None:
+            time_limit = self.time_limit - (time.perf_counter() - start) if self.time_limit is not None else None
+            if self.parallel:
+                pos = self.search_parallel(board, me, time_limit)
+            else:
+                pos = self.search(board, me, time_limit)
+        place_func(*pos)
+
+        if log_history:
+            self.play_history.append((encode_state(board_state, me), pos[0] * 8 + pos[1]))
+
+        return True
+
+    def search_parallel(self, board: Board, tile, time_limit=None):
+        """
+        Returns the move with the most visits summed over the workers' trees.
+        """
+        seeds = np.random.randint(2 ** 31, size=self.n_workers).tolist()
+        results = self.map_workers([(board.copy(), tile, seed, time_limit) for seed in seeds])
+
+        visits = {}
+        for moves, move_visits in results:
+            for move, n in zip(moves.tolist(), move_visits.tolist()):
+                visits[move] = visits.get(move, 0) + n
+        self.simulations = sum(move_visits.sum() for _, move_visits in results)
+        return divmod(max(visits, key=visits.get), board.board_size)
+
+    def search_task(self, board: Board, tile, seed, time_limit):
+        """
+        Worker search with root noise drawn from seed; returns the root
+        moves and their visit counts.
+        """
+        np.random.seed(seed)
+        self._noise = self.root_noise
+        try:
+            self.search(board, tile, time_limit)
+        finally:
+            self._noise = 0.0
+        children = slice(self.first_child[0], self.first_child[0] + self.n_children[0])
+        return self.move[children].copy(), self.visits[children].copy()
+
+    def search(self, board: Board, tile, time_limit=None):
+        """
+        Builds a new tree from the position and returns the most visited
+        move. time_limit replaces the player's own time limit. The board is
+        searched in place with push/pop and is left unchanged.
+        """
+        start = time.perf_counter()
+        if time_limit is None:
+            time_limit = self.time_limit
+        deadline = start + time_limit if time_limit is not None else np.inf
+        self.n_nodes = 1
+        self.visits[0] = self.value_sum[0] = self.q[0] = 0
+        self.first_child[0] = -1
+        self.simulations = 0
+
+        # At least one batch, so the root is expanded even without a budget
+        while True:
+            self.run_batch(board, tile, max(1, min(self.batch_size, self.n_simulations - self.simulations)))
+            if self.simulations >= self.n_simulations or time.perf_counter() >= deadline:
+                break
+
+        self.elapsed = time.perf_counter() - start
+        children = slice(self.first_child[0], self.first_child[0] + self.n_children[0])
+        move = int(self.move[children][np.argmax(self.visits[children])])
+        return divmod(move, board.board_size)
+
+    def select(self, node):
+        children = slice(self.first_child[node], self.first_child[node] + self.n_children[node])
+        visits = self.visits[children]
+        q = np.divide(self.value_sum[children], visits, out=self.q[children].copy(), where=visits > 0)
+        u = self.c_puct * self.prior[children] * np.sqrt(self.visits[node]) / (1 + visits)
+        return children.start + int(np.argmax(q + u))
+
+    def run_batch(self, board: Board, tile, batch_size):
+        """
+        Selects up to batch_size leaves, expands them with one forward pass
+        and backs their values up.
+        """
+        size = board.board_size
+        # (path, tile to move at the leaf, legal moves, whether the values
+        # come from the opponent's point of view) of every leaf to evaluate
+        leaves = []
+        states = []
+        for _ in range(batch_size):
+            node, leaf_tile, path, n_pushed = 0, tile, [0], 0
+            while self.first_child[node] >= 0:
+                node = self.select(node)
+                move = int(self.move[node])
+                if move != MCTSPlayer.PASS:
+                    board.push(leaf_tile, move // size, move % size)
+                    n_pushed += 1
+                leaf_tile = -leaf_tile
+                path.append(node)
+
+            path = np.array(path)
+            if any(path[-1] == leaf[0][-1] for leaf in leaves):
+                # Already waiting for its value, the batch is as spread out
+                # as it gets
+                for _ in range(n_pushed):
+                    board.pop()
+                break
+
+            moves = board.legal_moves(leaf_tile)
+            if moves:
+                states.append(encode_state(board.get_state(), leaf_tile).reshape(-1))
+                leaves.append((path, leaf_tile, moves, False))
+            else:
+                replies = board.legal_moves(-leaf_tile)
+                if replies:
+                    # Only a pass is possible, its value comes from the
+                    # opponent's side
+                    states.append(encode_state(board.get_state(), -leaf_tile).reshape(-1))
+                    leaves.append((path, leaf_tile, replies, True))
+                else:
+                    # The game is over
+                    self.backup(path, np.sign(final_score(board, leaf_tile)), virtual_loss=0)
+                    self.simulations += 1
+                    for _ in range(n_pushed):
+                        board.pop()
+                    continue
+
+            self.visits[path] += self.virtual_loss
+            self.value_sum[path] -= self.virtual_loss
+            for _ in range(n_pushed):
+                board.pop()
+
+        if not leaves:
+            return
+
+        out = self.policy_net.get_output_batch(np.array(states))
+        for (path, leaf_tile, moves, passing), q in zip(leaves, out):
+            squares = [row * size + col for row, col in moves]
+            q = q[squares]
+            if passing:
+                self.expand(path[-1], [MCTSPlayer.PASS], np.ones(1), -q.max(keepdims=True))
+            else:
+                priors = np.exp((q - q.max()) / self.prior_temperature)
+                priors /= priors.sum()
+                if self._noise and path[-1] == 0:
+                    priors = (1 - self._noise) * priors + self._noise * np.random.dirichlet(np.full(len(q), 0.3))
+                self.expand(path[-1], squares, priors, q)
+            # The leaf is worth what the net gave its move to the player who
+            # made it
+            self.backup(path, -self.q[path[-1]], self.virtual_loss)
+            self.simulations += 1
 
-            if i != n_play_history:
-                action, q = action_, q_
+    def expand(self, node, moves, priors, q):
+        first = self.n_nodes
+        if first + len(moves) > self.max_nodes:
+            return
+        children = slice(first, first + len(moves))
+        self.move[children] = moves
+        self.prior[children] = priors
+        self.q[children] = q
+        self.visits[children] = 0
+        self.value_sum[children] = 0
+        self.first_child[children] = -1
+        self.first_child[node] = first
+        self.n_children[node] = len(moves)
+        self.n_nodes += len(moves)
 
-        # print(len(self.play_history))
-        # for i in range(len(self.play_history)-1, -1, -1):
-        #    print(i)
-        #    t = self.policy_net.mkVec(targets[i])
-        #    self.policy_net.backProp(state, t)
+    def backup(self, path, value, virtual_loss):
+        """
+        Adds a visit with value, from the point of view of the player to move
+        at the leaf, to every node of path and takes back its virtual loss.
+        """
+        # The leaf holds the value for the player who moved into it, the
+        # sign alternates on the way up
+        signs = np.where(np.arange(len(path))[::-1] % 2 == 0, -1.0, 1.0)
+        self.visits[path] += 1 - virtual_loss
+        self.value_sum[path] += signs * value + virtual_loss
 
 
 class HumanPlayer(PlayerModel):
@@ -0,0 +1,90 @@
+import argparse
+import time
+
+import numpy as np
+
+from src.board import encode_states
+from src.nn import NN, PRECISIONS
+from src.vec_game import VecBoard
+
+
+def make_corpus(n_positions=5000, seed=0, n_boards=256):
+    """
+    Plays random games in lockstep and returns (input_states, legal) for
+    n_positions positions from every stage of the game: the encoded boards
+    of the player to move and their legal-square masks.
+    """
+    rng = np.random.default_rng(seed)
+    input_states, legal_masks = [], []
+    n_collected = 0
+    while n_collected < n_positions:
+        board = VecBoard(n_boards)
+        turn = np.full(n_boards, -1)
+        for _ in range(60):
+            legal = board.legal_mask(turn)
+            can_move = legal.any(axis=1)
+            if not can_move.any():
+                break
+            input_states.append(encode_states(board.get_states()[can_move], turn[can_move]))
+            legal_masks.append(legal[can_move])
+            n_collected += can_move.sum()
+
+            # Random legal move on every board that has one
+            actions = np.where(legal, rng.random(legal.shape), -1).argmax(axis=1)
+            board.push(turn, np.where(can_move, actions, -1))
+            turn = -turn
+
+    return np.vstack(input_states)[:n_positions], np.vstack(legal_masks)[:n_positions]
+
+
+def check_precision(weights, precision, input_states, legal):
+    """
+    Compares the net at precision against the float64 net on a corpus.
+    Returns the fraction of positions where both pick the same legal move,
+    the fraction where the reduced net's move is worse by more than 1e-3 in
+    the float64 net's own outputs (the nets saturate, so many positions have
+    several moves tied at the top), and the seconds per single-position
+    forward pass at that precision.
+    """
+    reference = NN([], 0)
+    reference.load(weights)
+    net = NN([], 0)
+    net.load(weights)
+    net.set_precision(precision)
+
+    reference_out = np.where(legal, reference.get_output_batch(input_states), -np.inf)
+    reference_moves = reference_out.argmax(axis=1)
+    moves = np.where(legal, net.get_output_batch(input_states), -np.inf).argmax(axis=1)
+
+    rows = np.arange(len(moves))
+    regret = reference_out[rows, reference_moves] - reference_out[rows, moves]
+    agreement = np.mean(moves == reference_moves)
+    worse = np.mean(regret > 1e-3)
+
+    column = input_states[:1].T
+    net.get_output(column)
+    n_calls = 2000
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        net.get_output(column)
+    return agreement, worse, (time.perf_counter() - start) / n_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare move choices of reduced-precision nets against float64")
+    parser.add_argument('weights', nargs='+', help="Weights files to check")
+    parser.add_argument('-n', '--n_positions', type=int, default=5000, help="Number of positions in the corpus")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random games the corpus comes from")
+
+    args = parser.parse_args()
+    input_states, legal = make_corpus(args.n_positions, args.seed)
+    for weights in args.weights:
+        print(weights)
+        for precision in PRECISIONS:
+            agreement, worse, latency = check_precision(weights, precision, input_states, legal)
+            print(f"\t{precision:<8} same move: {agreement:.2%}  worse move: {worse:.2%}  "
+                  f"{latency * 1e6:.1f} us/position")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import numpy as np
+
+# The 8 symmetries of the 8x8 board, shared by bitboards, (N, 64) state
+# matrices and action indices (row * 8 + col). Symmetry k moves the disc on
+# square s to square SQUARE_MAPS[k][s].
+
+K1 = 0x5555555555555555
+K2 = 0x3333333333333333
+K4 = 0x0f0f0f0f0f0f0f0f
+D1 = 0x5500550055005500
+D2 = 0x3333000033330000
+D4 = 0x0f0f0f0f00000000
+
+
+def flip_vertical(bits):
+    """
+    Mirrors a bitboard top to bottom: row r becomes row 7 - r.
+    """
+    return int.from_bytes(bits.to_bytes(8, "little"), "big")
+
+
+def mirror_horizontal(bits):
+    """
+    Mirrors a bitboard left to right: col c becomes col 7 - c.
+    """
+    bits = ((bits >> 1) & K1) | ((bits & K1) << 1)
+    bits = ((bits >> 2) & K2) | ((bits & K2) << 2)
+    return ((bits >> 4) & K4) | ((bits & K4) << 4)
+
+
+def flip_diagonal(bits):
+    """
+    Transposes a bitboard: (row, col) becomes (col, row).
+    """
+    t = D4 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = D2 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = D1 & (bits ^ (bits << 7))
+    return bits ^ t ^ (t >> 7)
+
+
+TRANSFORMS = (
+    lambda bits: bits,
+    flip_vertical,
+    mirror_horizontal,
+    lambda bits: flip_vertical(mirror_horizontal(bits)),  # rotate 180
+    flip_diagonal,
+    lambda bits: flip_vertical(flip_diagonal(bits)),  # rotate 90 anticlockwise
+    lambda bits: mirror_horizontal(flip_diagonal(bits)),  # rotate 90 clockwise
+    lambda bits: flip_vertical(mirror_horizontal(flip_diagonal(bits))),  # anti-diagonal
+)
+
+SQUARE_MAPS = np.array([[transform(1 << s).bit_length() - 1 for s in range(64)] for transform in TRANSFORMS])
+# SOURCE_SQUARES[k][t] is the square whose disc symmetry k moves to t
+SOURCE_SQUARES = np.argsort(SQUARE_MAPS, axis=1)
+# INVERSES[k] undoes symmetry k
+INVERSES = tuple(next(j for j in range(8) if (SQUARE_MAPS[j][SQUARE_MAPS[k]] == np.arange(64)).all())
+                 for k in range(8))
+
+
+def transform_bits(bits, k):
+    return TRANSFORMS[k](bits)
+
+
+def transform_states(states, k):
+    """
+    Applies symmetry k to one or many flattened states, (..., 64).
+    Q-value vectors indexed by action transform the same way.
+    """
+    return np.asarray(states)[..., SOURCE_SQUARES[k]]
+
+
+def transform_action(action, k):
+    return int(SQUARE_MAPS[k][action])
+
+
+def augment(samples, targets):
+    """
+    Returns every (sample, target) row in all 8 symmetries: two (8N, 64)
+    matrices, the 8 versions of each row next to each other.
+    """
+    n_samples = len(samples)
+    return (np.asarray(samples)[:, SOURCE_SQUARES].reshape((n_samples * 8, -1)),
+            np.asarray(targets)[:, SOURCE_SQUARES].reshape((n_samples * 8, -1)))
+
+
+def canonical_bits(black, white):
+    """
+    Returns (black, white, k): the smallest of the 8 symmetric versions of a
+    bitboard position and the symmetry k that produces it. Use
+    transform_action(action, INVERSES[k]) to map moves on the canonical
+    position back.
+    """
+    return min((TRANSFORMS[k](black), TRANSFORMS[k](white), k) for k in range(8))
+
+
+def canonical_state(state):
+    """
+    Returns (state, k) for a flat or 8x8 state array: the symmetric version
+    with the smallest bytes and the symmetry that produces it.
+    """
+    versions = np.asarray(state).reshape(-1)[SOURCE_SQUARES]
+    k = min(range(8), key=lambda i: versions[i].tobytes())
+    return versions[k].reshape(np.shape(state)), k
@@ -0,0 +1,126 @@
+import contextlib
+import functools
+import math
+import multiprocessing
+import random
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from tqdm import tqdm
+
+from src.game import Game
+from src.game_log import GameLogWriter
+
+# Players and game log of the current tournament, set once per worker process
+_players = None
+_game_log = None
+
+
+@dataclass
+class TournamentResult:
+    wins: int = 0
+    losses: int = 0
+    draws: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def n_games(self):
+        return self.wins + self.losses + self.draws
+
+    @property
+    def score(self):
+        """
+        Points per game of player 1: 1 for a win, 0.5 for a draw.
+        """
+        return (self.wins + 0.5 * self.draws) / self.n_games if self.n_games else 0.0
+
+    def confidence_interval(self, z=1.96):
+        """
+        Normal-approximation interval of score, 95% by default.
+        """
+        if not self.n_games:
+            return 0.0, 1.0
+        second_moment = (self.wins + 0.25 * self.draws) / self.n_games
+        stderr = math.sqrt(max(second_moment - self.score ** 2, 0.0) / self.n_games)
+        return max(self.score - z * stderr, 0.0), min(self.score + z * stderr, 1.0)
+
+    @property
+    def games_per_second(self):
+        return self.n_games / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        low, high = self.confidence_interval()
+        return (
+            f"Player 1 won {self.wins}, lost {self.losses}, drew {self.draws} of {self.n_games} games\n"
+            f"Player 1 score: {self.score:.3f} (95% CI {low:.3f} - {high:.3f})\n"
+            f"{self.games_per_second:.1f} games/s"
+        )
+
+
+def play_game(player_1, player_2, game_index, seed=0, show_board=False, game_log=None):
+    """
+    Plays game number game_index of a tournament and returns 1, -1 or 0 for a
+    player_1 win, loss or draw. Colours alternate with the game index and the
+    random generators are seeded from seed + game_index, so every game of a
+    tournament can be replayed on its own.
+    """
+    game_seed = seed + game_index
+    np.random.seed(game_seed % 2 ** 32)
+    random.seed(game_seed)
+
+    if game_index % 2 == 0:
+        game = Game(player_1, False, player_2, False, board_size=8, game_log=game_log, seed=game_seed)
+        me = game.players[0].id
+    else:
+        game = Game(player_2, False, player_1, False, board_size=8, game_log=game_log, seed=game_seed)
+        me = game.players[1].id
+    game.run(show_board=show_board)
+
+    score = game.get_score()
+    return int(np.sign(score[me] - score[-me]))
+
+
+def _init_worker(player_1, player_2, game_log):
+    global _players, _game_log
+    _players = (player_1, player_2)
+    _game_log = GameLogWriter(game_log) if game_log else None
+
+
+def _play_worker_game(game_index, seed):
+    return play_game(*_players, game_index, seed, game_log=_game_log)
+
+
+def run_tournament(player_1, player_2, n_games, n_workers=1, seed=0, show_board=False, game_log=None):
+    """
+    Plays n_games between player_1 and player_2, sharded over n_workers
+    processes, and returns a TournamentResult from player_1's point of view.
+    Each worker receives its own copy of both players once. Boards can only
+    be shown when the games run in this process. Every game is appended to
+    the game log file game_log if given.
+    """
+    result = TournamentResult()
+    start = time.perf_counter()
+
+    # Opened here first so the log header exists before any worker appends
+    with GameLogWriter(game_log) if game_log else contextlib.nullcontext() as log:
+        if n_workers > 1 and not show_board:
+            with multiprocessing.Pool(n_workers, initializer=_init_worker,
+                                      initargs=(player_1, player_2, game_log)) as pool:
+                games = pool.imap(functools.partial(_play_worker_game, seed=seed), range(n_games),
+                                  chunksize=max(1, n_games // (n_workers * 4)))
+                outcomes = list(tqdm(games, total=n_games, desc="Testing"))
+        else:
+            outcomes = [play_game(player_1, player_2, i, seed, show_board, log)
+                        for i in tqdm(range(n_games), desc="Testing")]
+
+    for outcome in outcomes:
+        if outcome > 0:
+            result.wins += 1
+        elif outcome < 0:
+            result.losses += 1
+        else:
+            result.draws += 1
+
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring buffer of self-play transitions in preallocated
+    arrays: the int8 encoded state, the int16 action, the float32 return (the
+    final score of the transition's game) and whether it ends the game. A
+    transition's next state is the one stored right after it, so games are
+    always added whole. Once full, the oldest transitions are overwritten.
+    About 75 bytes per transition, priorities included.
+    """
+
+    def __init__(self, capacity, board_size=8, alpha=0.6):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.states = np.zeros((capacity, board_size ** 2), np.int8)
+        self.actions = np.zeros(capacity, np.int16)
+        self.returns = np.zeros(capacity, np.float32)
+        self.dones = np.zeros(capacity, bool)
+        # Sampling priorities, already raised to alpha
+        self.priorities = np.zeros(capacity, np.float32)
+        self.max_priority = 1.0
+
+        self.size = 0
+        # Index the next transition is written to
+        self.head = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.states, self.actions, self.returns, self.dones, self.priorities))
+
+    def add_game(self, play_history, final_score):
+        """
+        Stores the (input_state, action) transitions of one game, as logged by
+        RLPlayer.play, with the game's final score as their return.
+        """
+        n = len(play_history)
+        if not n:
+            return
+        if n > self.capacity:
+            play_history = play_history[-self.capacity:]
+            n = self.capacity
+
+        idx = (self.head + np.arange(n)) % self.capacity
+        self.states[idx] = np.hstack([state for state, _ in play_history]).T
+        self.actions[idx] = [action for _, action in play_history]
+        self.returns[idx] = final_score
+        self.dones[idx] = False
+        self.dones[idx[-1]] = True
+        # New transitions are sampled at least once before their error is known
+        self.priorities[idx] = self.max_priority ** self.alpha
+
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size, prioritised=False):
+        """
+        Returns the indices of batch_size transitions drawn uniformly, or in
+        proportion to their priority.
+        """
+        if prioritised:
+            cumulative = np.cumsum(self.priorities[:self.size], dtype=np.float64)
+            keys = np.random.random(batch_size) * cumulative[-1]
+            return np.minimum(np.searchsorted(cumulative, keys, side="right"), self.size - 1)
+        return np.random.randint(self.size, size=batch_size)
+
+    def get_batch(self, indices):
+        """
+        Returns (states, actions, next_states, returns, dones) for indices.
+        States are float rows ready for the net; the next state of a
+        transition that ends its game is meaningless and masked by dones.
+        """
+        next_indices = (indices + 1) % self.capacity
+        return (self.states[indices].astype(float), self.actions[indices].astype(int),
+                self.states[next_indices].astype(float), self.returns[indices], self.dones[indices])
+
+    def update_priorities(self, indices, errors):
+        """
+        Sets the priorities of sampled transitions from their absolute TD
+        errors.
+        """
+        priorities = np.abs(errors) + 1e-3
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.priorities[indices] = priorities ** self.alpha
@@ -1,64 +1,203 @@
+import multiprocessing
 import os
+import random
 from datetime import datetime
 
 import numpy as np
 from matplotlib import pyplot as plt
 
 from src.game import Game
+from src.game_log import GameLogWriter
+from src import symmetry
 from src.players import RLPlayer
-
-
-def main(n_epochs=20, match_size=20, discount_factor=0.99, net_lr=0.03):
+from src.training.replay_buffer import ReplayBuffer
+from src.vec_game import VecGame
+
+
+def play_game(player, rp, board_size=8, game_log=None, seed=0):
+    """
+    Plays one game of player (logging its moves) against rp and returns
+    player's play history together with its score in [-1, 1]. The random
+    generators are seeded from seed, which is recorded in the game log.
+    """
+    player.play_history = []
+    np.random.seed(seed % 2 ** 32)
+    random.seed(seed)
+
+    # Initialize a new game
+    g = Game(player_1=player, log_history_1=True, player_2=rp, log_history_2=False, board_size=board_size,
+             game_log=game_log, seed=seed)
+    g.run()
+    # print(player.play_history)
+
+    final_score = list(g.get_score().items())
+    final_score.sort()
+    ttl = sum(map(lambda x: x[1], final_score))
+    # print(ttl)
+
+    # Only deal with 1 of the players (The one we're updating the weights for)
+    # player_score = int(final_score[0][1]/ttl >= 0.5)
+    player_score = (final_score[0][1] / ttl - 0.5) * 2
+    return player.play_history, player_score
+
+
+def play_games_vec(player, rp, n_games):
+    """
+    Same as calling play_game n_games times, but plays all games in lockstep
+    with VecGame so both players choose their moves in batches.
+    """
+    g = VecGame(player_1=player, log_history_1=True, player_2=rp, log_history_2=False, n_games=n_games)
+    score = g.run()
+
+    # Player 1 has id -1, as in play_game
+    ttl = score[-1] + score[1]
+    player_scores = (score[-1] / ttl - 0.5) * 2
+    return list(zip(g.histories[-1], player_scores.tolist()))
+
+
+def self_play(player, rp, n_games, board_size=8, vectorized=False, game_log=None, seed=0):
+    """
+    Plays n_games of player against rp and returns the [(play_history, score)]
+    of every game. Games played one by one are seeded with seed + game index
+    and appended to game_log (a GameLogWriter) if given; lockstep games do
+    not track both players' moves and cannot be logged.
+    """
+    if vectorized:
+        if game_log:
+            raise ValueError("Lockstep (vectorized) self-play cannot write a game log")
+        return play_games_vec(player, rp, n_games)
+    return [play_game(player, rp, board_size, game_log, seed + i) for i in range(n_games)]
+
+
+def play_games(player_layers, rp_layers, epsilon, n_games, seed, discount_factor=0.99, board_size=8,
+               vectorized=False, game_log=None):
+    """
+    Self-play worker: plays n_games with snapshots of both players' weights
+    and returns the [(play_history, score)] of every game. Games are appended
+    to the game log file game_log if given.
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    player = RLPlayer(discount_factor, 0, board_size=board_size, eval_cache_size=0)
+    player.policy_net.layers = player_layers
+    player.epsilon = epsilon
+    rp = RLPlayer(0, 0, board_size=board_size, eval_cache_size=0)
+    rp.policy_net.layers = rp_layers
+
+    if not game_log:
+        return self_play(player, rp, n_games, board_size, vectorized, seed=seed)
+    with GameLogWriter(game_log, board_size) as log:
+        return self_play(player, rp, n_games, board_size, vectorized, log, seed)
+
+
+def train_on_epoch(player, player_gameplay_history, batch_size, augment):
+    """
+    Trains once on every transition of the epoch's games, in shuffled
+    mini-batches.
+    """
+    samples, targets = [], []
+    for game, score in player_gameplay_history:
+        player.play_history = game
+        game_samples, game_targets = player.get_training_batch(score)
+        samples.append(game_samples)
+        targets.append(game_targets)
+    samples, targets = np.vstack(samples), np.vstack(targets)
+    if augment:
+        # Every transition is as valid in all 8 symmetries of the board
+        samples, targets = symmetry.augment(samples, targets)
+
+    order = np.random.permutation(len(samples))
+    for start in range(0, len(samples), batch_size):
+        batch = order[start:start + batch_size]
+        player.policy_net.back_prop_batch(samples[batch], targets[batch])
+
+
+def train_on_replay(player, replay, n_transitions, batch_size, augment, prioritised):
+    """
+    Trains on as many mini-batches sampled from the replay buffer as the
+    epoch added transitions, so older games keep being reused.
+    """
+    for _ in range(-(-n_transitions // batch_size)):
+        indices = replay.sample(batch_size, prioritised)
+        states, actions, next_states, returns, dones = replay.get_batch(indices)
+        targets, errors = player.get_replay_targets(states, actions, next_states, returns, dones)
+        if prioritised:
+            replay.update_priorities(indices, errors)
+        if augment:
+            states, targets = symmetry.augment(states, targets)
+        player.policy_net.back_prop_batch(states, targets)
+
+
+def main(n_epochs=20, match_size=20, discount_factor=0.99, net_lr=0.03, batch_size=32, n_workers=1,
+         vectorized=False, augment=False, replay_capacity=0, prioritised=False, game_log=None):
+    if vectorized and game_log:
+        raise ValueError("Lockstep (vectorized) self-play cannot write a game log")
     plt.ion()
 
     board_size = 8
 
-    player = RLPlayer(discount_factor, net_lr, board_size=board_size)
-    rp = RLPlayer(0, 0, board_size=board_size)
+    # The learner's weights change after every mini-batch, which would keep
+    # clearing an eval cache
+    player = RLPlayer(discount_factor, net_lr, board_size=board_size, eval_cache_size=0)
+    rp = RLPlayer(0, 0, board_size=board_size, eval_cache_size=0)
+
+    # Self-play is spread over a pool of worker processes, the weights are
+    # only ever updated here
+    pool = multiprocessing.Pool(n_workers) if n_workers > 1 else None
+    # Self-play games are streamed to this file if given, the header is
+    # written here before any worker appends
+    log = GameLogWriter(game_log, board_size) if game_log else None
+
+    # Transitions of past epochs to train on again, none are kept by default
+    replay = ReplayBuffer(replay_capacity, board_size) if replay_capacity else None
 
     player_wins = []
     for e in range(1, n_epochs + 1):
         print(f"Epoch: {e}")
 
-        player.wins = 0
         # Anneal the exploration rate
         player.epsilon = (np.exp(-0.017 * e) + 0.11) / 1.1
         player_gameplay_history = []
 
         # number of games to play for one epoch
-        for _ in range(match_size):
-            # print("Game: %d"%g)
-            player.play_history = []
-
-            # Initialize a new game
-            g = Game(player_1=player, log_history_1=True, player_2=rp, log_history_2=False, board_size=board_size)
-            g.run()
-            # print(player.play_history)
-
-            final_score = list(g.get_score().items())
-            final_score.sort()
-            ttl = sum(map(lambda x: x[1], final_score))
-            # print(ttl)
-
-            # Only deal with 1 of the players (The one we're updating the weights for)
-            # player_score = int(final_score[0][1]/ttl >= 0.5)
-            player_score = (final_score[0][1] / ttl - 0.5) * 2
-            player.wins += player_score > 0
-            # print(player_score)
-            player_gameplay_history.append((player.play_history, player_score))
-
+        if pool:
+            chunks = [len(c) for c in np.array_split(range(match_size), n_workers) if len(c)]
+            seeds = np.random.randint(2 ** 31, size=len(chunks)).tolist()
+            results = pool.starmap(play_games, [
+                (player.policy_net.layers, rp.policy_net.layers, player.epsilon, n_games, seed, discount_factor,
+                 board_size, vectorized, game_log) for n_games, seed in zip(chunks, seeds)
+            ])
+            for games in results:
+                player_gameplay_history.extend(games)
+        else:
+            seed = int(np.random.randint(2 ** 31))
+            player_gameplay_history = self_play(player, rp, match_size, board_size, vectorized, log, seed)
+
+        player.wins = sum(player_score > 0 for _, player_score in player_gameplay_history)
         print(player.epsilon, player.wins)
         player_wins.append(player.wins)
-        for game, score in player_gameplay_history:
-            player.play_history = game
-            player.update_weights(score)
+
+        if replay is not None:
+            for game, score in player_gameplay_history:
+                replay.add_game(game, score)
+            n_transitions = sum(len(game) for game, _ in player_gameplay_history)
+            train_on_replay(player, replay, n_transitions, batch_size, augment, prioritised)
+        else:
+            train_on_epoch(player, player_gameplay_history, batch_size, augment)
+
+    if pool:
+        pool.close()
+        pool.join()
+    if log:
+        log.close()
 
     print("Wins:", sum(player_wins))
     dest_path = "./models"
     os.makedirs(dest_path, exist_ok=True)
 
     filename = f"{datetime.now().strftime('%d%H%M%S')}-{n_epochs}-{match_size}-{board_size}-best-linear-{net_lr}"
-    player.policy_net.save(f"{dest_path}/{filename}.weights")
+    player.policy_net.save(f"{dest_path}/{filename}.nnw")
     with open(f"{dest_path}/{filename}.csv", "w") as f:
         f.write("\n".join(map(str, player_wins)))
     print("Saved:", f"{dest_path}/{filename}")
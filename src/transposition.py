@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of search results keyed by Board.get_hash().
+
+    Every slot stores the full key, the search depth, the bound type, the best
+    move (as row * board_size + col, -1 for none) and the value. The table is
+    allocated once from memory_mb and never grows. A slot is replaced when it
+    is empty, holds the same position, was written by an older search, or
+    holds a shallower result than the new one.
+    """
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, memory_mb=16):
+        entry_size = 8 + 4 + 2 + 1 + 1 + 1  # key, value, move, depth, bound, generation
+        self.size = max(1, int(memory_mb * 1024 * 1024) // entry_size)
+
+        self.keys = np.full(self.size, -1, np.int64)
+        self.values = np.zeros(self.size, np.float32)
+        self.moves = np.full(self.size, -1, np.int16)
+        self.depths = np.zeros(self.size, np.int8)
+        self.bounds = np.zeros(self.size, np.int8)
+        self.generations = np.zeros(self.size, np.uint8)
+
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.keys, self.values, self.moves, self.depths, self.bounds, self.generations))
+
+    @property
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def new_search(self):
+        """
+        Marks the start of a new search so entries from earlier ones are
+        replaced first.
+        """
+        self.generation = (self.generation + 1) % 256
+
+    def clear(self):
+        self.keys.fill(-1)
+        self.moves.fill(-1)
+        self.generation = 0
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def probe(self, key):
+        """
+        Returns (depth, bound, move, value) stored for key, or None.
+        """
+        i = key % self.size
+        if self.keys[i] == key:
+            self.hits += 1
+            return int(self.depths[i]), int(self.bounds[i]), int(self.moves[i]), float(self.values[i])
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, move, value):
+        i = key % self.size
+        stored_key = self.keys[i]
+        if stored_key != key and stored_key != -1:
+            if self.generations[i] == self.generation and self.depths[i] > depth:
+                return
+            self.overwrites += 1
+
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.bounds[i] = bound
+        self.moves[i] = move
+        self.values[i] = value
+        self.generations[i] = self.generation
+        self.stores += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "size": self.size,
+            "bytes": self.nbytes,
+        }
@@ -0,0 +1,167 @@
+import numpy as np
+
+from src.board import SHIFTS, Board, encode_states
+
+# The BitBoard shift table as uint64 scalars so NumPy keeps every operation
+# in unsigned 64-bit arithmetic
+VEC_SHIFTS = tuple((np.uint64(abs(shift)), shift > 0, np.uint64(mask)) for shift, mask in SHIFTS)
+
+
+def _shift(x, shift, left, mask):
+    return (np.left_shift(x, shift) if left else np.right_shift(x, shift)) & mask
+
+
+def unpack_bits(bits):
+    """
+    Returns an (N, 64) uint8 array with a 1 for every set bit of the (N,)
+    uint64 array bits, bit i in column i.
+    """
+    return np.unpackbits(bits.astype("<u8").view(np.uint8).reshape((-1, 8)), axis=1, bitorder="little")
+
+
+class VecBoard:
+    """
+    N 8x8 boards stored as two (N,) uint64 arrays, one per colour, with the
+    same bit layout as BitBoard. Move generation and flipping run the BitBoard
+    shift-and-mask operations on all boards at once.
+    """
+
+    def __init__(self, n_boards):
+        self.n_boards = n_boards
+        self.board_size = 8
+        self.bits = {
+            Board.BLACK: np.full(n_boards, (1 << (3 * 8 + 3)) | (1 << (4 * 8 + 4)), np.uint64),
+            Board.WHITE: np.full(n_boards, (1 << (4 * 8 + 3)) | (1 << (3 * 8 + 4)), np.uint64),
+        }
+
+    def get_own_opp(self, tiles):
+        """
+        Returns the (own, opponent) bitboards of every board for the player
+        given per board in tiles.
+        """
+        black_to_move = tiles == Board.BLACK
+        own = np.where(black_to_move, self.bits[Board.BLACK], self.bits[Board.WHITE])
+        opp = np.where(black_to_move, self.bits[Board.WHITE], self.bits[Board.BLACK])
+        return own, opp
+
+    def get_moves(self, tiles):
+        """
+        Returns the (N,) uint64 masks of legal moves for the player given per
+        board in tiles.
+        """
+        own, opp = self.get_own_opp(tiles)
+        empty = ~(own | opp)
+
+        moves = np.zeros(self.n_boards, np.uint64)
+        for shift, left, mask in VEC_SHIFTS:
+            x = _shift(own, shift, left, mask) & opp
+            for _ in range(5):
+                x |= _shift(x, shift, left, mask) & opp
+            moves |= _shift(x, shift, left, mask) & empty
+        return moves
+
+    def legal_mask(self, tiles):
+        """
+        Returns an (N, 64) bool array of legal squares for the player given
+        per board in tiles.
+        """
+        return unpack_bits(self.get_moves(tiles)).astype(bool)
+
+    def get_flips(self, tiles, moves):
+        """
+        Returns the (N,) uint64 masks of discs flipped when tiles[i] plays the
+        single-bit square moves[i]; boards with a 0 move flip nothing.
+        """
+        own, opp = self.get_own_opp(tiles)
+
+        flips = np.zeros(self.n_boards, np.uint64)
+        for shift, left, mask in VEC_SHIFTS:
+            line = np.zeros(self.n_boards, np.uint64)
+            x = _shift(moves, shift, left, mask)
+            # A run of opponent discs is only flipped once it reaches one of
+            # our own; the longest run on an 8x8 board is six discs
+            for _ in range(7):
+                flips |= np.where(x & own != 0, line, np.uint64(0))
+                x &= opp
+                line |= x
+                x = _shift(x, shift, left, mask)
+        return flips
+
+    def push(self, tiles, actions):
+        """
+        Plays actions[i] (row * 8 + col, or -1 to pass) for tiles[i] on every
+        board. The moves are assumed to be legal.
+        """
+        played = actions >= 0
+        moves = np.where(played, np.left_shift(np.uint64(1), np.maximum(actions, 0).astype(np.uint64)), np.uint64(0))
+        flips = self.get_flips(tiles, moves)
+
+        black_moved = tiles == Board.BLACK
+        black, white = self.bits[Board.BLACK], self.bits[Board.WHITE]
+        self.bits[Board.BLACK] = np.where(black_moved, black | flips | moves, black & ~flips)
+        self.bits[Board.WHITE] = np.where(black_moved, white & ~flips, white | flips | moves)
+
+    def get_states(self):
+        """
+        Returns the (N, 8, 8) int8 array of all boards, in the Board.get_state
+        encoding.
+        """
+        states = unpack_bits(self.bits[Board.BLACK]).astype(np.int8) - unpack_bits(self.bits[Board.WHITE])
+        return states.reshape((self.n_boards, self.board_size, self.board_size))
+
+    def get_scores(self):
+        """
+        Returns {Board.BLACK: (N,) disc counts, Board.WHITE: (N,) disc counts}.
+        """
+        return {tile: unpack_bits(bits).sum(axis=1) for tile, bits in self.bits.items()}
+
+
+class VecGame:
+    """
+    Runs N games of the same two players in lockstep. Every ply computes the
+    legal moves, flips and finished games of all boards with single NumPy
+    calls and asks each player for all of its moves with one batched
+    forward pass (RLPlayer.choose_moves). Mirrors Game: player 1 has id -1
+    and moves first, and a game ends after two passes in a row.
+    """
+
+    def __init__(self, player_1, log_history_1, player_2, log_history_2, n_games):
+        self.n_games = n_games
+        self.board = VecBoard(n_games)
+        self.players = [(player_1, Board.WHITE, log_history_1), (player_2, Board.BLACK, log_history_2)]
+        # Per game list of (input_state, action) for every player that logs
+        self.histories = {tile: [[] for _ in range(n_games)] for _, tile, log in self.players if log}
+
+    def get_score(self):
+        return self.board.get_scores()
+
+    def run(self):
+        turn = np.full(self.n_games, self.players[0][1])
+        n_passed = np.zeros(self.n_games, int)
+        finished = np.zeros(self.n_games, bool)
+
+        while not finished.all():
+            legal = self.board.legal_mask(turn)
+            can_move = legal.any(axis=1) & ~finished
+            n_passed = np.where(can_move, 0, n_passed + 1)
+            finished |= n_passed >= 2
+
+            actions = np.full(self.n_games, -1)
+            states = None
+            for player, tile, log_history in self.players:
+                games = np.flatnonzero(can_move & (turn == tile))
+                if not len(games):
+                    continue
+                if states is None:
+                    states = self.board.get_states()
+                input_states = encode_states(states[games], turn[games]).astype(int)
+                actions[games] = player.choose_moves(input_states, legal[games])
+
+                if log_history:
+                    for game, input_state, action in zip(games, input_states, actions[games]):
+                        self.histories[tile][game].append((input_state.reshape((-1, 1)), int(action)))
+
+            self.board.push(turn, actions)
+            turn = -turn
+
+        return self.get_score()